@@ -0,0 +1,224 @@
+"""Benchmark suite for AsyncExecutor throughput.
+
+Runs graphs of various topologies, concurrency settings, queue sizes,
+and payload sizes, and reports for each scenario:
+
+* items/sec: node function calls per second, across all nodes
+* per-item overhead: wall time per node function call, in microseconds
+  (the node functions themselves do no work)
+* peak memory: peak memory allocated during the graph execution,
+  from a separate run traced by :mod:`tracemalloc`
+
+Results can be saved as JSON and compared with an earlier run.
+
+Usage::
+
+    python benchmarks/bench_executor.py [--items N] [--repeat R] [--filter TEXT]
+        [--output results.json] [--compare baseline.json]
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from collections.abc import Callable
+from datetime import datetime, timezone
+from typing import Any, NamedTuple
+
+import async_graph_data_flow
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+LARGE_PAYLOAD_SIZE = 64 * 1024
+
+
+class Scenario(NamedTuple):
+    name: str
+    build: Callable[[int], AsyncGraph]
+    # The number of node function calls in one graph execution, given the number
+    # of items from the start node
+    num_calls: Callable[[int], int]
+    executor_kwargs: dict[str, Any] = {}
+
+
+def make_source(num_items: int, large_payload: bool):
+    async def source():
+        for i in range(num_items):
+            # A new payload object for each item, as if read from somewhere
+            yield bytes(LARGE_PAYLOAD_SIZE) if large_payload else i
+
+    return source
+
+
+async def passthrough(data):
+    yield data
+
+
+async def sink(data):
+    return
+    yield
+
+
+def chain(
+    length: int,
+    *,
+    large_payload: bool = False,
+    max_tasks: int = 1,
+    queue_size=None,
+    fuse_chains: bool = False,
+    scheduling: str | None = None,
+) -> Scenario:
+    def build(num_items: int) -> AsyncGraph:
+        graph = AsyncGraph()
+        graph.add_node(make_source(num_items, large_payload), name="source")
+        prev = "source"
+        for i in range(length - 2):
+            name = f"passthrough_{i}"
+            queue = None if queue_size is None else asyncio.Queue(maxsize=queue_size)
+            graph.add_node(passthrough, name=name, max_tasks=max_tasks, queue=queue)
+            graph.add_edge(prev, name)
+            prev = name
+        graph.add_node(sink, name="sink", max_tasks=max_tasks)
+        graph.add_edge(prev, "sink")
+        return graph
+
+    payload_name = "large" if large_payload else "small"
+    name = f"chain-{length}-tasks{max_tasks}-{payload_name}"
+    if queue_size is not None:
+        name += f"-queue{queue_size}"
+    executor_kwargs: dict[str, Any] = {}
+    if fuse_chains:
+        name += "-fused"
+        executor_kwargs["fuse_chains"] = True
+    if scheduling is not None:
+        name += f"-{scheduling}"
+        executor_kwargs["scheduling"] = scheduling
+    return Scenario(name, build, lambda n: 1 + (length - 1) * n, executor_kwargs)
+
+
+def fan_out_fan_in(width: int, *, large_payload: bool = False) -> Scenario:
+    def build(num_items: int) -> AsyncGraph:
+        graph = AsyncGraph()
+        graph.add_node(make_source(num_items, large_payload), name="source")
+        graph.add_node(sink, name="sink")
+        for i in range(width):
+            name = f"branch_{i}"
+            graph.add_node(passthrough, name=name)
+            graph.add_edge("source", name)
+            graph.add_edge(name, "sink")
+        return graph
+
+    payload_name = "large" if large_payload else "small"
+    return Scenario(
+        f"fan-out-fan-in-{width}-{payload_name}", build, lambda n: 1 + 2 * width * n
+    )
+
+
+SCENARIOS = [
+    chain(3),
+    chain(3, large_payload=True),
+    chain(3, max_tasks=8),
+    chain(3, queue_size=10),
+    chain(10),
+    chain(10, fuse_chains=True),
+    chain(10, scheduling="downstream_first"),
+    chain(50),
+    chain(50, fuse_chains=True),
+    fan_out_fan_in(16),
+    fan_out_fan_in(16, large_payload=True),
+]
+
+
+def run_once(scenario: Scenario, num_items: int) -> float:
+    executor = AsyncExecutor(scenario.build(num_items), **scenario.executor_kwargs)
+    start = time.perf_counter()
+    executor.execute()
+    return time.perf_counter() - start
+
+
+def measure_peak_memory(scenario: Scenario, num_items: int) -> int:
+    tracemalloc.start()
+    try:
+        run_once(scenario, num_items)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+def run_scenario(scenario: Scenario, num_items: int, repeat: int) -> dict[str, Any]:
+    elapsed = statistics.median(run_once(scenario, num_items) for _ in range(repeat))
+    num_calls = scenario.num_calls(num_items)
+    return {
+        "scenario": scenario.name,
+        "items": num_items,
+        "calls": num_calls,
+        "seconds": elapsed,
+        "items_per_sec": num_calls / elapsed,
+        "per_item_overhead_us": elapsed / num_calls * 1e6,
+        "peak_memory_bytes": measure_peak_memory(scenario, num_items),
+    }
+
+
+def print_results(results: list[dict[str, Any]], baseline: dict[str, dict] | None):
+    header = f"{'scenario':<40}{'items/sec':>12}{'us/item':>10}{'peak MiB':>10}"
+    if baseline is not None:
+        header += f"{'vs baseline':>13}"
+    print(header)
+    for result in results:
+        line = (
+            f"{result['scenario']:<40}"
+            f"{result['items_per_sec']:>12,.0f}"
+            f"{result['per_item_overhead_us']:>10.2f}"
+            f"{result['peak_memory_bytes'] / 2**20:>10.2f}"
+        )
+        if baseline is not None:
+            if result["scenario"] in baseline:
+                base = baseline[result["scenario"]]["items_per_sec"]
+                line += f"{result['items_per_sec'] / base:>12.2f}x"
+            else:
+                line += f"{'n/a':>13}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--items", type=int, default=20_000, help="items from the start node"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="runs per scenario (median is kept)"
+    )
+    parser.add_argument("--filter", help="only run scenarios whose name has this text")
+    parser.add_argument("--output", help="save results to this JSON file")
+    parser.add_argument("--compare", help="compare with results from this JSON file")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = {r["scenario"]: r for r in json.load(f)["results"]}
+
+    scenarios = [s for s in SCENARIOS if not args.filter or args.filter in s.name]
+    results = [run_scenario(s, args.items, args.repeat) for s in scenarios]
+    print_results(results, baseline)
+
+    if args.output:
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "async_graph_data_flow_version": async_graph_data_flow.__version__,
+            "python_version": sys.version,
+            "platform": platform.platform(),
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Benchmark for building a large graph with AsyncGraph.
+
+Builds a random directed acyclic graph (edges only go from a node to a node
+added after it) and reports how long it takes to add the nodes and edges,
+which includes the cycle check for each new edge, and to find the start nodes.
+
+Usage::
+
+    python benchmarks/bench_graph_construction.py [--nodes N] [--edges M]
+"""
+
+import argparse
+import random
+import time
+
+from async_graph_data_flow import AsyncGraph
+
+
+async def node_func(data):
+    yield data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=10_000)
+    parser.add_argument("--edges", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = [f"node_{i}" for i in range(args.nodes)]
+    edges: set[tuple[str, str]] = set()
+    while len(edges) < args.edges:
+        i, j = sorted(rng.sample(range(args.nodes), 2))
+        edges.add((names[i], names[j]))
+
+    graph = AsyncGraph()
+
+    start = time.perf_counter()
+    for name in names:
+        graph.add_node(node_func, name=name)
+    add_nodes_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for src_node, dst_node in edges:
+        graph.add_edge(src_node, dst_node)
+    add_edges_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    start_nodes = graph._get_start_nodes()
+    start_nodes_time = time.perf_counter() - start
+
+    print(f"nodes: {args.nodes}, edges: {args.edges}")
+    print(f"add_node total:     {add_nodes_time:.3f} s")
+    print(f"add_edge total:     {add_edges_time:.3f} s")
+    print(f"start nodes ({len(start_nodes)}): {start_nodes_time * 1e3:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
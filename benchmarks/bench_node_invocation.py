@@ -0,0 +1,77 @@
+"""Micro-benchmark for the per-item overhead of invoking a node's function.
+
+Compares inspecting the node function's signature for every item
+(how ``AsyncExecutor`` used to call node functions)
+with the call plan precomputed once per graph execution.
+
+Usage::
+
+    python benchmarks/bench_node_invocation.py [--items N]
+"""
+
+import argparse
+import inspect
+import timeit
+
+from async_graph_data_flow import AsyncGraph
+from async_graph_data_flow.executor import _compile_node_call
+
+
+async def no_args():
+    yield
+
+
+async def one_arg(data):
+    yield data
+
+
+async def two_args(a, b):
+    yield a, b
+
+
+CASES = [
+    ("no-arg", no_args, "foo"),
+    ("single-arg", one_arg, "foo"),
+    ("positional-unpack", two_args, (1, 2)),
+    ("keyword-unpack", two_args, {"a": 1, "b": 2}),
+]
+
+
+def call_with_signature_inspection(node, data):
+    params = inspect.signature(node.func).parameters
+    if len(params) == 0:
+        return node.func()
+    elif node.unpack_input and isinstance(data, tuple):
+        return node.func(*data)
+    elif node.unpack_input and isinstance(data, dict):
+        return node.func(**data)
+    else:
+        return node.func(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=200_000)
+    args = parser.parse_args()
+
+    graph = AsyncGraph()
+    for name, func, _ in CASES:
+        graph.add_node(func, name=name)
+
+    print(f"{'call strategy':<20}{'before (ns/item)':>18}{'after (ns/item)':>18}")
+    for name, func, data in CASES:
+        node = graph._nodes[name]
+        call = _compile_node_call(node)
+
+        before = timeit.timeit(
+            lambda: call_with_signature_inspection(node, data), number=args.items
+        )
+        after = timeit.timeit(lambda: call(data), number=args.items)
+
+        before_ns = before / args.items * 1e9
+        after_ns = after / args.items * 1e9
+        print(f"{name:<20}{before_ns:>18.0f}{after_ns:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+from collections import Counter
+
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+word_counts: Counter = Counter()
+
+
+async def lines():
+    yield "the quick brown fox"
+    yield "jumps over the lazy dog"
+    yield "the end"
+
+
+async def count_words(line):
+    word_counts.update(line.split())
+    return
+    yield
+
+
+async def yield_word_counts():
+    # Called once `lines` is done and `count_words` has processed all lines.
+    yield word_counts.most_common(2)
+
+
+async def print_top_words(top_words):
+    print("top words:", top_words)
+    yield
+
+
+if __name__ == "__main__":
+    graph = AsyncGraph()
+    graph.add_node(lines)
+    graph.add_node(count_words, flush=yield_word_counts)
+    graph.add_node(print_top_words)
+    graph.add_edge(lines, count_words)
+    graph.add_edge(count_words, print_top_words)
+
+    AsyncExecutor(graph).execute()
+
+    # Output:
+    # -------
+    # top words: [('the', 3), ('quick', 1)]
@@ -0,0 +1,40 @@
+import hashlib
+
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+async def read_documents():
+    for i in range(4):
+        yield f"document {i} " * 100_000
+
+
+def hash_document(document):
+    # CPU-bound work in a plain (synchronous) generator function,
+    # run in worker processes instead of the event loop.
+    digest = document.encode()
+    for _ in range(100):
+        digest = hashlib.sha256(digest).digest()
+    yield digest.hex()[:16]
+
+
+async def write_hash(document_hash):
+    print("hash:", document_hash)
+    yield
+
+
+if __name__ == "__main__":
+    graph = AsyncGraph()
+    graph.add_node(read_documents)
+    graph.add_node(hash_document, executor="process", max_tasks=4)
+    graph.add_node(write_hash)
+    graph.add_edge(read_documents, hash_document)
+    graph.add_edge(hash_document, write_hash)
+
+    AsyncExecutor(graph).execute()
+
+    # Output (the order may vary):
+    # -------
+    # hash: d7552fdfd8dd9bef
+    # hash: 059fb5a36d768722
+    # hash: 44f139890bc4fd3a
+    # hash: e52b516debd49077
@@ -0,0 +1,30 @@
+import asyncio
+import itertools
+
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+async def read_messages():
+    # A never-ending stream, e.g., from a message queue
+    for i in itertools.count():
+        await asyncio.sleep(0.1)
+        yield f"message {i}"
+
+
+async def process(message):
+    await asyncio.sleep(0.5)
+    print(f"Processed: {message}")
+    yield
+
+
+if __name__ == "__main__":
+    graph = AsyncGraph()
+    graph.add_node(read_messages)
+    graph.add_node(process, max_tasks=5)
+    graph.add_edge("read_messages", "process")
+
+    executor = AsyncExecutor(graph)
+    executor.turn_on_drain_on_signals(timeout=30)
+    # Stop with `kill -TERM <pid>`: no more messages are read,
+    # and the messages already read are processed before the program exits.
+    executor.execute()
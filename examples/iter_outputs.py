@@ -0,0 +1,36 @@
+import asyncio
+from contextlib import aclosing
+
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+async def extract():
+    for word in ["hello", "async", "world"]:
+        yield word
+
+
+async def transform(data):
+    yield data.upper()
+
+
+async def main():
+    graph = AsyncGraph()
+    graph.add_node(extract)
+    graph.add_node(transform)
+    graph.add_edge("extract", "transform")
+
+    executor = AsyncExecutor(graph)
+    # `aclosing` cancels the graph execution right away if the loop stops early.
+    async with aclosing(executor.iter_outputs(maxsize=100)) as outputs:
+        async for node, item in outputs:
+            print(f"{node} yielded: {item}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+    # Output:
+    # -------
+    # transform yielded: HELLO
+    # transform yielded: ASYNC
+    # transform yielded: WORLD
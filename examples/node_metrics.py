@@ -0,0 +1,43 @@
+import asyncio
+
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+async def extract():
+    for i in range(100):
+        yield i
+
+
+async def transform(data):
+    await asyncio.sleep(0.01)
+    yield data * 2
+
+
+async def load(data):
+    yield
+
+
+if __name__ == "__main__":
+    graph = AsyncGraph()
+    graph.add_node(extract)
+    graph.add_node(transform, max_tasks=2)
+    graph.add_node(load)
+    graph.add_edge("extract", "transform")
+    graph.add_edge("transform", "load")
+
+    executor = AsyncExecutor(graph)
+    executor.turn_on_metrics()
+    executor.execute()
+
+    for node, node_metrics in executor.metrics["nodes"].items():
+        print(
+            f"{node}: {node_metrics['items_per_sec']:.0f} items/sec, "
+            f"p99 time to first yield = {node_metrics['time_to_first_yield']['p99']}s, "
+            f"p99 queue wait = {node_metrics['queue_wait']['p99']}s"
+        )
+
+    # Output (the numbers vary by run):
+    # -------
+    # extract: 175 items/sec, p99 time to first yield = 2e-05s, p99 queue wait = 0.0002s
+    # transform: 175 items/sec, p99 time to first yield = 0.05s, p99 queue wait = 1s
+    # load: 175 items/sec, p99 time to first yield = 1e-05s, p99 queue wait = 0.0005s
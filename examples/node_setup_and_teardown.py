@@ -0,0 +1,67 @@
+import asyncio
+
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+class Client:
+    """A stand-in for a client that is expensive to create, e.g., an HTTP session."""
+
+    async def get(self, url):
+        await asyncio.sleep(0.1)
+        return f"content of {url}"
+
+    async def close(self):
+        print("client closed")
+
+
+async def create_client():
+    print("client created")
+    return Client()
+
+
+async def close_client(client):
+    await client.close()
+
+
+async def get_urls():
+    for i in range(5):
+        yield f"https://example.com/{i}"
+
+
+async def fetch(client, url):
+    yield await client.get(url)
+
+
+async def print_content(content):
+    print(content)
+    yield
+
+
+def main():
+    graph = AsyncGraph()
+    graph.add_node(get_urls)
+    graph.add_node(
+        fetch,
+        max_tasks=5,
+        setup=create_client,
+        teardown=close_client,
+        setup_scope="node",
+    )
+    graph.add_node(print_content)
+    graph.add_edge("get_urls", "fetch")
+    graph.add_edge("fetch", "print_content")
+    AsyncExecutor(graph).execute()
+
+
+if __name__ == "__main__":
+    main()
+
+    # Output:
+    # -------
+    # client created
+    # content of https://example.com/0
+    # content of https://example.com/1
+    # content of https://example.com/2
+    # content of https://example.com/3
+    # content of https://example.com/4
+    # client closed
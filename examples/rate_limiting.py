@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+async def get_ids():
+    for i in range(10):
+        yield i
+
+
+async def fetch_user(user_id):
+    await asyncio.sleep(0.1)  # e.g., call an API
+    yield user_id
+
+
+async def fetch_orders(user_id):
+    await asyncio.sleep(0.1)  # e.g., call the same API
+    yield user_id
+
+
+def main():
+    graph = AsyncGraph()
+    graph.add_rate_limiter("api", 20, burst=5)
+    graph.add_node(get_ids)
+    graph.add_node(fetch_user, max_tasks=10, rate_limit="api")
+    graph.add_node(fetch_orders, max_tasks=10, rate_limit="api")
+    graph.add_edge("get_ids", "fetch_user")
+    graph.add_edge("get_ids", "fetch_orders")
+
+    start = time.perf_counter()
+    AsyncExecutor(graph).execute()
+    print(f"20 API calls in {time.perf_counter() - start:.1f} seconds")
+
+
+if __name__ == "__main__":
+    main()
+
+    # Output:
+    # -------
+    # 20 API calls in 0.9 seconds
@@ -0,0 +1,42 @@
+import asyncio
+
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+async def numbers(start, stop):
+    for i in range(start, stop):
+        await asyncio.sleep(0.1)
+        yield i
+
+
+async def square(number):
+    print(f"{number} squared is {number ** 2}")
+    yield
+
+
+async def main():
+    graph = AsyncGraph()
+    graph.add_node(numbers)
+    graph.add_node(square)
+    graph.add_edge(numbers, square)
+
+    executor = AsyncExecutor(graph)
+
+    # Two runs of the same graph, sharing the event loop of `main()`.
+    await asyncio.gather(
+        executor.run(start_nodes={"numbers": (0, 3)}),
+        executor.run(start_nodes={"numbers": (10, 13)}),
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+
+    # Output:
+    # -------
+    # 0 squared is 0
+    # 10 squared is 100
+    # 1 squared is 1
+    # 11 squared is 121
+    # 2 squared is 4
+    # 12 squared is 144
@@ -0,0 +1,34 @@
+import asyncio
+
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+def read_user_ids():
+    # E.g., read lines from a large file, without loading it all into memory
+    for user_id in range(1, 4):
+        yield (user_id,)
+
+
+async def fetch_user(user_id):
+    yield f"user{user_id}"
+
+
+async def save_user(user_name):
+    print(f"save_user received: {user_name}")
+    yield
+
+
+if __name__ == "__main__":
+    graph = AsyncGraph()
+    graph.add_node(fetch_user, queue=asyncio.Queue(maxsize=100))
+    graph.add_node(save_user)
+    graph.add_edge("fetch_user", "save_user")
+
+    executor = AsyncExecutor(graph)
+    executor.execute(start_nodes={"fetch_user": read_user_ids()})
+
+    # Output:
+    # -------
+    # save_user received: user1
+    # save_user received: user2
+    # save_user received: user3
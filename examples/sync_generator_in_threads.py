@@ -0,0 +1,50 @@
+import sqlite3
+import time
+
+from async_graph_data_flow import AsyncExecutor, AsyncGraph
+
+
+def query_rows(table):
+    # A synchronous generator function with blocking calls,
+    # such as a database driver without asyncio support.
+    connection = sqlite3.connect(":memory:")
+    connection.execute(f"CREATE TABLE {table} (id INTEGER)")
+    connection.executemany(f"INSERT INTO {table} VALUES (?)", [(i,) for i in range(3)])
+    for (row_id,) in connection.execute(f"SELECT id FROM {table}"):
+        time.sleep(1)  # Pretend that the query is slow.
+        yield table, row_id
+    connection.close()
+
+
+async def tables():
+    yield "users"
+    yield "orders"
+
+
+async def write_row(table, row_id):
+    print(f"{table}: row {row_id}")
+    yield
+
+
+if __name__ == "__main__":
+    graph = AsyncGraph()
+    graph.add_node(tables)
+    graph.add_node(query_rows, executor="thread", max_tasks=2)
+    graph.add_node(write_row)
+    graph.add_edge(tables, query_rows)
+    graph.add_edge(query_rows, write_row)
+
+    t1 = time.time()
+    AsyncExecutor(graph).execute()
+    t2 = time.time()
+    print("execution time:", t2 - t1)
+
+    # Output (the order may vary):
+    # -------
+    # users: row 0
+    # orders: row 0
+    # users: row 1
+    # orders: row 1
+    # users: row 2
+    # orders: row 2
+    # execution time: 3.0177972316741943
@@ -1,20 +1,1702 @@
 import asyncio
+import concurrent.futures
+import dataclasses
+import functools
 import inspect
 import logging
+import os
+import reprlib
+import signal
+import sys
+import threading
 import time
 import traceback
 from collections import deque
-from collections.abc import Iterable
-from typing import Any
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Generator,
+    Iterable,
+)
+from typing import Any, NamedTuple, cast
 
-from .graph import AsyncGraph, InvalidAsyncGraphError
+from .graph import AsyncGraph, InvalidAsyncGraphError, _Node
+from .metrics import (
+    PROMETHEUS_CONTENT_TYPE,
+    _EdgeMetrics,
+    _format_prometheus,
+    _Metrics,
+    _NodeMetrics,
+)
 
 
 _LOG = logging.getLogger(__name__)
 
+# A start node's args for one call, or an iterable of args for a call per args
+_StartNodeArgs = tuple | Iterable[tuple] | AsyncIterable[tuple]
+
 _DEFAULT_DATA_FLOW_LOGGING_NODE_FORMAT = " {node} - in={in}, out={out}, err={err}"
 _DEFAULT_DATA_FLOW_LOGGING_TIME_INTERVAL = 60  # in seconds
 
+_DEFAULT_METRICS_EXPORT_TIME_INTERVAL = 15  # in seconds
+
+_DEFAULT_ERROR_LOG_MAX_TRACEBACKS = 10  # per node
+_DEFAULT_ERROR_LOG_TIME_INTERVAL = 60  # in seconds
+
+# Max number of items a thread node's worker thread can get ahead of the event loop
+_THREAD_BRIDGE_MAXSIZE = 1_000
+
+# For the nodes with adaptive numbers of tasks, the error rate
+# and the factor of latency over the lowest latency so far
+# above which the number of tasks is halved
+_AUTOSCALE_MAX_ERROR_RATE = 0.1
+_AUTOSCALE_MAX_LATENCY_FACTOR = 2.0
+
+# With max_in_flight, only the items in these queues (and not in the subclasses,
+# whose gets need not match their puts one-to-one) are counted in flight.
+_IN_FLIGHT_QUEUE_TYPES = (asyncio.Queue, asyncio.PriorityQueue, asyncio.LifoQueue)
+
+_SCHEDULING_POLICIES = ("priority", "downstream_first")
+
+# Max length of an item's repr in an exception record
+_MAX_ITEM_REPR_LENGTH = 200
+
+_item_repr = reprlib.Repr()
+_item_repr.maxstring = _MAX_ITEM_REPR_LENGTH
+_item_repr.maxother = _MAX_ITEM_REPR_LENGTH
+
+# Put into a batched node's queue once all of its source nodes are done,
+# so that the node's last batch is passed on regardless of its size.
+_END_OF_STREAM = object()
+
+
+@dataclasses.dataclass
+class ExceptionRecord:
+    """A compact record of identical exceptions from a node.
+
+    Unlike an exception object, a record doesn't keep the traceback's frames
+    and their local variables alive.
+    See :attr:`~async_graph_data_flow.AsyncExecutor.exception_records`.
+    """
+
+    #: The exception's type, as ``"module.QualifiedName"``.
+    type: str
+    #: The exception's message, i.e., ``str(exc)``.
+    message: str
+    #: The formatted traceback.
+    traceback: str
+    #: The repr of the data item that the node was called with when the exception
+    #: was first raised, truncated; ``None`` for an exception from ``flush``.
+    item: str | None
+    #: The number of times the exception has been raised.
+    count: int = 1
+
+
+def _exception_type_name(exc: BaseException) -> str:
+    exc_type = type(exc)
+    return f"{exc_type.__module__}.{exc_type.__qualname__}"
+
+
+def _exception_locations(exc: BaseException) -> tuple[tuple[str, int], ...]:
+    """The (file name, line number) of each frame in an exception's traceback.
+
+    This is much cheaper than formatting the traceback,
+    which also reads the lines of source code.
+    """
+    locations = []
+    tb = exc.__traceback__
+    while tb is not None:
+        locations.append((tb.tb_frame.f_code.co_filename, tb.tb_lineno))
+        tb = tb.tb_next
+    return tuple(locations)
+
+
+def _safe_item_repr(item: Any) -> str:
+    try:
+        item_repr = _item_repr.repr(item)
+    except Exception:
+        return f"<{type(item).__qualname__} object (repr failed)>"
+    if len(item_repr) > _MAX_ITEM_REPR_LENGTH:
+        item_repr = item_repr[:_MAX_ITEM_REPR_LENGTH] + "..."
+    return item_repr
+
+
+async def _acquire_all(semaphores: tuple[asyncio.Semaphore, ...]):
+    """Acquire the semaphores in order, releasing them all if interrupted."""
+    for i, semaphore in enumerate(semaphores):
+        try:
+            await semaphore.acquire()
+        except BaseException:
+            for acquired_semaphore in semaphores[:i]:
+                acquired_semaphore.release()
+            raise
+
+
+class _AdaptiveTasks:
+    """The state of a node whose number of tasks adapts at runtime."""
+
+    __slots__ = (
+        "target",
+        "num_tasks",
+        "num_busy",
+        "num_calls",
+        "latency_sum",
+        "num_errors_seen",
+        "min_latency",
+        "idle_task_ids",
+    )
+
+    def __init__(self, target: int):
+        self.target = target
+        self.num_tasks = 0
+        self.num_busy = 0
+        # The tasks waiting for an item from the node's queue
+        self.idle_task_ids: set[str] = set()
+        # Since the last time the number of tasks was adjusted
+        self.num_calls = 0
+        self.latency_sum = 0.0
+        self.num_errors_seen = 0
+        # The lowest average latency of all time intervals so far
+        self.min_latency: float | None = None
+
+
+class _TokenBucket:
+    """A token bucket for a rate limit, shared by the tasks of one or more nodes.
+
+    A task that finds no token reserves the next one and sleeps until it's due,
+    so the waiting tasks get their tokens in turn at the rate, with no bursts.
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "last_time")
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_time = time.monotonic()
+
+    async def acquire(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.last_time) * self.rate)
+        self.last_time = now
+        self.tokens -= 1
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class _PriorityWaits:
+    """The numbers of items waiting in the nodes' queues by priority level.
+
+    The levels are the ranks of the nodes' distinct priorities,
+    from 0 for the lowest.
+    The highest level with waiting items is kept up to date,
+    so that a node can check for waiting items at higher levels in O(1).
+    """
+
+    __slots__ = ("counts", "max_level")
+
+    def __init__(self, num_levels: int):
+        self.counts = [0] * num_levels
+        self.max_level = -1
+
+    def add(self, level: int) -> None:
+        self.counts[level] += 1
+        if level > self.max_level:
+            self.max_level = level
+
+    def remove(self, level: int) -> None:
+        counts = self.counts
+        counts[level] -= 1
+        if level == self.max_level and counts[level] <= 0:
+            while level >= 0 and counts[level] <= 0:
+                level -= 1
+            self.max_level = level
+
+
+class _OutputQueue:
+    """The part of the queue for graph outputs that a node puts its items into.
+
+    Each item is tagged with the node's name, for
+    :meth:`~async_graph_data_flow.AsyncExecutor.iter_outputs`.
+    """
+
+    def __init__(self, queue: asyncio.Queue, node_name: str):
+        self._queue = queue
+        self._node_name = node_name
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
+
+    def put_nowait(self, item: Any) -> None:
+        self._queue.put_nowait((self._node_name, item))
+
+    async def put(self, item: Any) -> None:
+        await self._queue.put((self._node_name, item))
+
+
+class _OutEdge(NamedTuple):
+    # For the edge to the graph outputs, this is the source node itself,
+    # and the queue is an _OutputQueue.
+    dst_node: str
+    queue: asyncio.Queue
+    on_full: str
+    # Whether items can be put into the queue by ``put_nowait`` without bypassing
+    # a ``put`` overridden by a custom queue class.
+    put_nowait_ok: bool
+    # When metrics are on, the times at which the items in the queue were put,
+    # in the same first-in-first-out order as the items
+    put_times: deque[float] | None
+    # When metrics are on, where the time blocked on a full queue is recorded
+    metrics: _EdgeMetrics | None
+    # With a scheduling policy, the priority level of the destination node
+    priority_level: int | None
+
+
+class _RemoteTraceback(Exception):
+    """The formatted traceback of an exception raised in a worker process."""
+
+    def __init__(self, tb: str):
+        self.tb = tb
+
+    def __str__(self) -> str:
+        return self.tb
+
+
+def _collect_generator_items(
+    func: Callable[..., Generator], args: tuple, kwargs: dict
+) -> tuple[list, Exception | None, str | None]:
+    """Run a generator function to completion, in a worker process.
+
+    If the generator raises an exception, the items that it has yielded so far
+    are returned along with the exception and its formatted traceback,
+    which would otherwise be lost in pickling the exception.
+    """
+    items: list = []
+    try:
+        for item in func(*args, **kwargs):
+            items.append(item)
+    except Exception as exc:
+        return items, exc, traceback.format_exc()
+    return items, None, None
+
+
+def _run_in_process_pool(
+    func: Callable[..., Generator], pool: concurrent.futures.ProcessPoolExecutor
+) -> Callable[..., AsyncGenerator]:
+    """Wrap a generator function as an async generator function run by a pool."""
+
+    async def run_in_process_pool(*args: Any, **kwargs: Any) -> AsyncGenerator:
+        loop = asyncio.get_running_loop()
+        items, exc, tb = await loop.run_in_executor(
+            pool, functools.partial(_collect_generator_items, func, args, kwargs)
+        )
+        for item in items:
+            yield item
+        if exc is not None:
+            raise exc from _RemoteTraceback(cast(str, tb))
+
+    return run_in_process_pool
+
+
+def _item_nbytes(item: Any) -> int:
+    if isinstance(item, (str, bytes, bytearray)):
+        return len(item)
+    return sys.getsizeof(item)
+
+
+def _write_file_atomically(path: str, text: str) -> None:
+    # Write to a temporary file first, so that a reader never sees a partial file.
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _set_future_result(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+class _ThreadBridge:
+    """Pass the items that a generator yields in a worker thread to the event loop.
+
+    The worker thread wakes up the event loop only when the event loop is waiting
+    for items. Otherwise, items accumulate in a buffer and the event loop takes
+    them in one batch, so that a fast generator doesn't cost
+    one ``call_soon_threadsafe`` per item.
+    The worker thread waits while the buffer is full, for backpressure.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self._loop = loop
+        self._maxsize = maxsize
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._waiter: asyncio.Future | None = None
+        self._finished = False
+        self._closed = False
+        self._exc: BaseException | None = None
+
+    def run(self, func: Callable[..., Generator], args: tuple, kwargs: dict) -> None:
+        """Run the generator function in the worker thread."""
+        exc = None
+        try:
+            gen = func(*args, **kwargs)
+            try:
+                for item in gen:
+                    if not self._put(item):
+                        break
+            finally:
+                gen.close()
+        except BaseException as e:
+            exc = e
+        with self._cond:
+            self._finished = True
+            self._exc = exc
+            waiter, self._waiter = self._waiter, None
+        if waiter is not None:
+            self._loop.call_soon_threadsafe(_set_future_result, waiter)
+
+    def _put(self, item: Any) -> bool:
+        with self._cond:
+            while len(self._items) >= self._maxsize and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                return False
+            self._items.append(item)
+            waiter, self._waiter = self._waiter, None
+        if waiter is not None:
+            self._loop.call_soon_threadsafe(_set_future_result, waiter)
+        return True
+
+    async def get_items(self) -> list | None:
+        """Get all items available so far, or ``None`` if the generator is done."""
+        while True:
+            with self._cond:
+                if self._items:
+                    items = list(self._items)
+                    self._items.clear()
+                    self._cond.notify()
+                    return items
+                if self._finished:
+                    if self._exc is not None:
+                        raise self._exc
+                    return None
+                waiter = self._waiter = self._loop.create_future()
+            await waiter
+
+    def close(self) -> None:
+        """Stop the generator in the worker thread at its next yield."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+
+def _run_in_thread_pool(
+    func: Callable[..., Generator], pool: concurrent.futures.ThreadPoolExecutor
+) -> Callable[..., AsyncGenerator]:
+    """Wrap a generator function as an async generator function run by a pool."""
+
+    async def run_in_thread_pool(*args: Any, **kwargs: Any) -> AsyncGenerator:
+        loop = asyncio.get_running_loop()
+        bridge = _ThreadBridge(loop, _THREAD_BRIDGE_MAXSIZE)
+        loop.run_in_executor(pool, bridge.run, func, args, kwargs)
+        try:
+            while (items := await bridge.get_items()) is not None:
+                for item in items:
+                    yield item
+        finally:
+            bridge.close()
+
+    return run_in_thread_pool
+
+
+def _compile_node_call(
+    node: _Node, pool: concurrent.futures.Executor | None = None, context: tuple = ()
+) -> Callable[[Any], AsyncGenerator]:
+    """Precompute how a node's function is called with an item from its queue.
+
+    Inspecting the function's signature and checking ``unpack_input`` only depend
+    on the node itself, so they're done once per graph execution
+    instead of once per item.
+    ``context`` holds the positional arguments to pass before those from the item,
+    i.e., the context from the node's setup function, if any.
+    """
+    has_params = len(inspect.signature(node.func).parameters) > len(context)
+
+    func: Callable[..., AsyncGenerator]
+    if node.executor == "thread":
+        func = _run_in_thread_pool(
+            cast(Callable[..., Generator], node.func),
+            cast(concurrent.futures.ThreadPoolExecutor, pool),
+        )
+    elif node.executor == "process":
+        func = _run_in_process_pool(
+            cast(Callable[..., Generator], node.func),
+            cast(concurrent.futures.ProcessPoolExecutor, pool),
+        )
+    else:
+        func = cast(Callable[..., AsyncGenerator], node.func)
+    if context:
+        func = functools.partial(func, *context)
+
+    if not has_params:
+
+        def call_with_no_args(data: Any) -> AsyncGenerator:
+            return func()
+
+        return call_with_no_args
+
+    if not node.unpack_input:
+        return func
+
+    def call_with_unpacking(data: Any) -> AsyncGenerator:
+        if isinstance(data, tuple):
+            return func(*data)
+        elif isinstance(data, dict):
+            return func(**data)
+        else:
+            return func(data)
+
+    return call_with_unpacking
+
+
+class _NodeContext:
+    """The context from a node's setup function, set up at its first use.
+
+    It's shared by either the calls of one of the node's tasks or all of the node's
+    calls, depending on the node's ``setup_scope``.
+    """
+
+    def __init__(self, node: _Node, pool: concurrent.futures.Executor | None):
+        self.node = node
+        self.pool = pool
+        self.lock = asyncio.Lock()
+        self.value: Any = None
+        # The node's call with the context, once set up
+        self.node_call: Callable[[Any], AsyncGenerator] | None = None
+
+    async def get_node_call(self) -> Callable[[Any], AsyncGenerator]:
+        if self.node_call is None:
+            async with self.lock:
+                if self.node_call is None:
+                    setup = cast(Callable[[], Awaitable[Any]], self.node.setup)
+                    self.value = await setup()
+                    self.node_call = _compile_node_call(
+                        self.node, self.pool, (self.value,)
+                    )
+        return self.node_call
+
+    async def close(self) -> None:
+        if self.node_call is not None:
+            self.node_call = None
+            if self.node.teardown is not None:
+                await self.node.teardown(self.value)
+
+
+class _GraphExecution:
+    """The state and tasks of one graph execution by an :class:`AsyncExecutor`.
+
+    A new instance is created for every run,
+    so that an executor can be reused and run concurrently.
+    """
+
+    def __init__(
+        self,
+        executor: "AsyncExecutor",
+        start_node_args: dict[str, _StartNodeArgs],
+        output_queue: asyncio.Queue | None = None,
+        output_nodes: Iterable[str] = (),
+    ):
+        self.executor = executor
+        self.graph = executor._graph
+        self.logger = executor._logger
+        self.start_node_args = start_node_args
+        # Where the items from the output nodes are put, for iter_outputs
+        self.output_queue = output_queue
+        self.output_nodes = set(output_nodes)
+        self.producer_tasks: dict[str, asyncio.Task] = {}
+        # For chain fusion, each node whose function is called by its source node's
+        # task directly (instead of through a queue) by the source node's name
+        self.fused_nodes: dict[str, str] = {}
+
+        self.node_queues: dict[str, asyncio.Queue] = {}
+        # For batched nodes, the queues of batches between the batcher and consumers
+        self.node_batch_queues: dict[str, asyncio.Queue] = {}
+        self.node_done: dict[str, asyncio.Event] = {}
+        self.node_calls: dict[str, Callable[[Any], AsyncGenerator]] = {}
+        self.node_out_edges: dict[str, tuple[_OutEdge, ...]] = {}
+        self.consumer_tasks: dict[str, asyncio.Task] = {}
+        # The tasks retired by autoscaling, which may still be tearing down
+        self.retired_consumer_tasks: list[asyncio.Task] = []
+        self.num_consumer_tasks_created: dict[str, int] = {}
+        self.adaptive_tasks: dict[str, _AdaptiveTasks] = {}
+        # The nodes with the same named rate limiter share a token bucket.
+        self.node_token_buckets: dict[str, _TokenBucket] = {}
+        # For the nodes with setup_scope="node", the context shared by all calls
+        self.node_contexts: dict[str, _NodeContext] = {}
+        # With a scheduling policy, the queues of the nodes with higher priorities
+        # than each node
+        self.priority_waits: _PriorityWaits | None = None
+        self.node_priority_levels: dict[str, int] = {}
+        # The semaphores of each node's resource pools, in the order to acquire them
+        self.node_semaphores: dict[str, tuple[asyncio.Semaphore, ...]] = {}
+        # With max_in_flight, the number of items in the queues of the nodes
+        # other than the start nodes or being processed by these nodes,
+        # these nodes, and the number of their queues that each node
+        # puts its items into.
+        # A start node's queue isn't counted even if the node has source nodes,
+        # since its args can't be told apart from the items from its source nodes.
+        self.num_in_flight = 0
+        self.in_flight_room: asyncio.Event | None = None
+        self.in_flight_nodes: set[str] = set()
+        self.node_num_in_flight_out_edges: dict[str, int] = {}
+        self.batcher_tasks: list[asyncio.Task] = []
+        self.node_pools: dict[str, concurrent.futures.Executor] = {}
+        self.halt_pipeline_execution = False
+        self.halted = asyncio.Event()
+        # The number of node function calls running their code,
+        # for the grace period of a halt
+        self.num_running_calls = 0
+        self.running_calls_done: asyncio.Event | None = None
+
+        # Draining stops the start nodes, and lets the other nodes process
+        # the items already in the graph until the drain timeout.
+        self.draining = False
+        self.drain_requested = asyncio.Event()
+        self.drain_timeout: float | None = None
+        # The number of items discarded at each node by a drain or a halt
+        self.num_unprocessed: dict[str, int] = {}
+        self.finished = asyncio.Event()
+
+        self.data_flow_stats: dict[str, dict[str, int]] = {}
+        self.exceptions: dict[str, deque[Exception]] = {}
+        # In the compact exceptions mode, the records of each node by signature,
+        # from the least to the most recently first raised.
+        self.exception_records: dict[
+            str, dict[tuple[str, str, tuple], ExceptionRecord]
+        ] = {}
+        # For error log throttling
+        self.num_logged_tracebacks: dict[str, int] = {}
+        self.suppressed_exceptions: dict[str, dict[tuple[str, tuple], int]] = {}
+
+        self.metrics: _Metrics | None = None
+        self.node_put_times: dict[str, deque[float]] = {}
+
+    def _log_data_flow_nodes(self):
+        for node, flow in self.data_flow_stats.items():
+            if (
+                self.executor._data_flow_logging_node_filter
+                and node not in self.executor._data_flow_logging_node_filter
+            ):
+                continue
+
+            self.logger.info(
+                self.executor._data_flow_logging_node_format.format(node=node, **flow)
+            )
+
+    async def _log_data_flow_periodically(self):
+        """Log data flow statistics at every time interval until cancelled."""
+        while True:
+            await asyncio.sleep(self.executor._data_flow_logging_time_interval)
+            if self.executor._data_flow_logging:
+                self._log_data_flow_nodes()
+
+    def _format_metrics_text(self) -> str:
+        return _format_prometheus(
+            self.data_flow_stats,
+            {node_name: queue.qsize() for node_name, queue in self.node_queues.items()},
+            None if self.metrics is None else self.metrics.snapshot(),
+        )
+
+    async def _serve_metrics(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """Respond to an HTTP request with the metrics, at any path."""
+        try:
+            # Skip the request line and headers.
+            while await reader.readline() not in (b"\r\n", b"\n", b""):
+                pass
+            body = self._format_metrics_text().encode("utf-8")
+            header = (
+                "HTTP/1.1 200 OK\r\n"
+                f"Content-Type: {PROMETHEUS_CONTENT_TYPE}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                "Connection: close\r\n\r\n"
+            )
+            writer.write(header.encode("ascii") + body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _write_metrics_file(self):
+        text = self._format_metrics_text()
+        await asyncio.to_thread(
+            _write_file_atomically, self.executor._metrics_export_path, text
+        )
+
+    async def _write_metrics_file_periodically(self):
+        """Write the metrics to a file at every time interval until cancelled."""
+        while True:
+            await asyncio.sleep(self.executor._metrics_export_time_interval)
+            await self._write_metrics_file()
+
+    async def _sample_queue_depths_periodically(self):
+        """Keep track of the nodes' queue depth high-water marks until cancelled."""
+        metrics = cast(_Metrics, self.metrics)
+        while True:
+            for node_name, queue in self.node_queues.items():
+                node_metrics = metrics.nodes[node_name]
+                node_metrics.queue_depth_max = max(
+                    node_metrics.queue_depth_max, queue.qsize()
+                )
+            await asyncio.sleep(self.executor._metrics_sample_interval)
+
+    def _find_fused_nodes(self) -> dict[str, str]:
+        """Find the edges of linear chains of nodes that can be fused.
+
+        An edge's destination node is fused into its source node's task
+        if each is a single-task async node with no other edge in between
+        and no feature that depends on the destination node's queue or tasks.
+        """
+
+        def is_fusible(node: _Node) -> bool:
+            return (
+                node.max_tasks == 1
+                and node.executor == "async"
+                and node.queue is None
+                and not node.is_batched
+                and node.flush is None
+                and node.min_tasks is None
+                and node.rate_limit is None
+                and node.resource_pools is None
+                and node.setup is None
+            )
+
+        fused_nodes = {}
+        for src_node, dst_nodes in self.graph._nodes_to_edges.items():
+            if len(dst_nodes) != 1 or src_node in self.output_nodes:
+                continue
+            (dst_node,) = dst_nodes
+            if (
+                len(self.graph._nodes_to_sources[dst_node]) == 1
+                and dst_node not in self.start_node_args
+                and self.graph._edges_on_full[(src_node, dst_node)] == "block"
+                and is_fusible(self.graph._nodes[src_node])
+                and is_fusible(self.graph._nodes[dst_node])
+            ):
+                fused_nodes[src_node] = dst_node
+        return fused_nodes
+
+    def _compile_node_out_edges(self, node_name: str) -> tuple[_OutEdge, ...]:
+        out_edges = []
+        for dst_node in self.graph._nodes_to_edges[node_name]:
+            queue = self.node_queues[dst_node]
+            queue_cls = type(queue)
+            out_edges.append(
+                _OutEdge(
+                    dst_node=dst_node,
+                    queue=queue,
+                    on_full=self.graph._edges_on_full[(node_name, dst_node)],
+                    put_nowait_ok=(
+                        queue_cls.put is asyncio.Queue.put
+                        and queue_cls.put_nowait is asyncio.Queue.put_nowait
+                    ),
+                    put_times=self.node_put_times.get(dst_node),
+                    priority_level=self.node_priority_levels.get(dst_node),
+                    metrics=(
+                        None
+                        if self.metrics is None
+                        else self.metrics.edges[node_name][dst_node]
+                    ),
+                )
+            )
+        if node_name in self.output_nodes:
+            out_edges.append(
+                _OutEdge(
+                    dst_node=node_name,
+                    queue=cast(
+                        asyncio.Queue,
+                        _OutputQueue(cast(asyncio.Queue, self.output_queue), node_name),
+                    ),
+                    on_full="block",
+                    put_nowait_ok=True,
+                    put_times=None,
+                    metrics=None,
+                    priority_level=None,
+                )
+            )
+        return tuple(out_edges)
+
+    async def _add_to_node_queue(self, node_name: str, item: Any):
+        """Deliver an item yielded by a node to all of its destination nodes.
+
+        Queues with room get the item right away, so that a full queue
+        doesn't hold up the delivery to the other destination nodes.
+        """
+        if self.in_flight_room is not None:
+            self.num_in_flight += self.node_num_in_flight_out_edges[node_name]
+        blocked_out_edges = []
+        for out_edge in self.node_out_edges[node_name]:
+            queue = out_edge.queue
+            if not queue.full():
+                if out_edge.put_nowait_ok:
+                    queue.put_nowait(item)
+                    if out_edge.put_times is not None:
+                        out_edge.put_times.append(time.perf_counter())
+                    if out_edge.priority_level is not None:
+                        cast(_PriorityWaits, self.priority_waits).add(
+                            out_edge.priority_level
+                        )
+                else:
+                    blocked_out_edges.append(out_edge)
+            elif out_edge.on_full == "block":
+                blocked_out_edges.append(out_edge)
+            elif out_edge.on_full == "drop_newest":
+                self._update_data_flow_drop_stats(out_edge.dst_node)
+                if out_edge.dst_node in self.in_flight_nodes:
+                    self._finish_in_flight(1)
+            else:  # "drop_oldest"
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    pass
+                else:
+                    queue.task_done()
+                    if out_edge.put_times is not None:
+                        out_edge.put_times.popleft()
+                    self._update_data_flow_drop_stats(out_edge.dst_node)
+                    if out_edge.dst_node in self.in_flight_nodes:
+                        self._finish_in_flight(1)
+                    if out_edge.priority_level is not None:
+                        cast(_PriorityWaits, self.priority_waits).remove(
+                            out_edge.priority_level
+                        )
+                if out_edge.put_nowait_ok:
+                    queue.put_nowait(item)
+                    if out_edge.put_times is not None:
+                        out_edge.put_times.append(time.perf_counter())
+                    if out_edge.priority_level is not None:
+                        cast(_PriorityWaits, self.priority_waits).add(
+                            out_edge.priority_level
+                        )
+                else:
+                    blocked_out_edges.append(out_edge)
+
+        if len(blocked_out_edges) == 1:
+            await self._put(blocked_out_edges[0], item)
+        elif blocked_out_edges:
+            await asyncio.gather(
+                *(self._put(out_edge, item) for out_edge in blocked_out_edges)
+            )
+
+    def _find_priority_levels(self) -> dict[str, int]:
+        if self.executor._scheduling == "downstream_first":
+            priorities = self.graph._get_node_depths()
+        else:
+            priorities = {
+                node_name: node.priority
+                for node_name, node in self.graph._nodes.items()
+            }
+        levels = {
+            priority: level
+            for level, priority in enumerate(sorted(set(priorities.values())))
+        }
+        return {
+            node_name: levels[priority] for node_name, priority in priorities.items()
+        }
+
+    async def _give_way_to_higher_priorities(self, level: int):
+        """Let the nodes with higher priorities run if they have items waiting.
+
+        This yields for one turn of the event loop only, so that a busy node
+        with a higher priority doesn't stall the nodes with lower priorities.
+        """
+        if cast(_PriorityWaits, self.priority_waits).max_level > level:
+            await asyncio.sleep(0)
+
+    def _finish_in_flight(self, num_items: int):
+        """Count items that are no longer in flight, for max_in_flight."""
+        self.num_in_flight -= num_items
+        if self.num_in_flight < cast(int, self.graph.max_in_flight):
+            cast(asyncio.Event, self.in_flight_room).set()
+
+    async def _wait_for_in_flight_room(self):
+        """Wait until the number of items in flight is below max_in_flight."""
+        in_flight_room = cast(asyncio.Event, self.in_flight_room)
+        while self.num_in_flight >= cast(int, self.graph.max_in_flight):
+            in_flight_room.clear()
+            await in_flight_room.wait()
+
+    async def _put(self, out_edge: _OutEdge, item: Any):
+        queue = out_edge.queue
+        if out_edge.metrics is not None and queue.full():
+            node_metrics = cast(_Metrics, self.metrics).nodes[out_edge.dst_node]
+            node_metrics.queue_depth_max = max(
+                node_metrics.queue_depth_max, queue.qsize()
+            )
+            start_time = time.perf_counter()
+            await queue.put(item)
+            out_edge.metrics.blocked_put.record(time.perf_counter() - start_time)
+        else:
+            await queue.put(item)
+        if out_edge.put_times is not None:
+            out_edge.put_times.append(time.perf_counter())
+        if out_edge.priority_level is not None:
+            cast(_PriorityWaits, self.priority_waits).add(out_edge.priority_level)
+
+    async def _producer(self, node: str, args: _StartNodeArgs):
+        """Push args to a start node's queue to begin the pipeline.
+
+        Args from an iterable are pulled one at a time,
+        waiting for room in the start node's queue.
+        """
+        if isinstance(args, tuple):
+            if self.draining:
+                self.num_unprocessed[node] += 1
+            else:
+                await self._put_start_node_args(node, args)
+        elif isinstance(args, AsyncIterable):
+            async for one_args in args:
+                if self.draining or self.halt_pipeline_execution:
+                    break
+                await self._put_start_node_args(node, one_args)
+        else:
+            for one_args in args:
+                if self.draining or self.halt_pipeline_execution:
+                    break
+                await self._put_start_node_args(node, one_args)
+
+    async def _put_start_node_args(self, node: str, args: tuple):
+        if not isinstance(args, tuple):
+            raise TypeError(f"args for the node '{node}' isn't a tuple: {args}")
+        try:
+            await self.node_queues[node].put(args)
+        except asyncio.CancelledError:
+            # Cancelled by a drain or a halt while waiting for room in the queue
+            self.num_unprocessed[node] += 1
+            raise
+        if self.priority_waits is not None:
+            self.priority_waits.add(self.node_priority_levels[node])
+        if node in self.node_put_times:
+            self.node_put_times[node].append(time.perf_counter())
+
+    async def _batcher(self, node_name: str):
+        """Group items from a batched node's queue into batches for its consumers."""
+        node = self.graph._nodes[node_name]
+        queue = self.node_queues[node_name]
+        batch_queue = self.node_batch_queues[node_name]
+        priority_level = self.node_priority_levels.get(node_name)
+        is_in_flight_node = node_name in self.in_flight_nodes
+        loop = asyncio.get_running_loop()
+
+        batch: list = []
+        batch_nbytes = 0
+        batch_deadline = 0.0
+
+        async def pass_on_batch():
+            nonlocal batch, batch_nbytes
+            # The batch stays in hand until it's in the batch queue,
+            # so that it's counted as unprocessed if cancelled while waiting.
+            await batch_queue.put(batch)
+            for _ in batch:
+                queue.task_done()
+            batch, batch_nbytes = [], 0
+
+        try:
+            while True:
+                if batch and node.batch_timeout is not None:
+                    try:
+                        item = await asyncio.wait_for(
+                            queue.get(), timeout=max(batch_deadline - loop.time(), 0)
+                        )
+                    except asyncio.TimeoutError:
+                        await pass_on_batch()
+                        continue
+                else:
+                    item = await queue.get()
+
+                if item is _END_OF_STREAM:
+                    if batch:
+                        await pass_on_batch()
+                    queue.task_done()
+                    continue
+                if priority_level is not None:
+                    cast(_PriorityWaits, self.priority_waits).remove(priority_level)
+                if is_in_flight_node:
+                    # Not when the batch is processed, since a start node waiting
+                    # for room would otherwise keep the batch from filling up.
+                    self._finish_in_flight(1)
+
+                if not batch and node.batch_timeout is not None:
+                    batch_deadline = loop.time() + node.batch_timeout
+                batch.append(item)
+                if node.batch_bytes is not None:
+                    batch_nbytes += _item_nbytes(item)
+
+                if (node.batch_size is not None and len(batch) >= node.batch_size) or (
+                    node.batch_bytes is not None and batch_nbytes >= node.batch_bytes
+                ):
+                    await pass_on_batch()
+        except asyncio.CancelledError:
+            # Cancelled by a drain or a halt, with a batch in hand
+            self.num_unprocessed[node_name] += len(batch)
+            for _ in batch:
+                queue.task_done()
+            raise
+
+    async def _wait_for_node_done(self, node_name: str):
+        """Wait until a node has processed all the items it will ever get."""
+        producer_task = self.producer_tasks.get(node_name)
+        if producer_task is not None:
+            # Not `await producer_task`, which would raise CancelledError here
+            # if a drain or a halt has cancelled the producer.
+            await asyncio.wait((producer_task,))
+            if not producer_task.cancelled():
+                producer_task.result()
+        for src_node in self.graph._nodes_to_sources[node_name]:
+            await self.node_done[src_node].wait()
+
+        # No more items will be put into this node's queue.
+        queue = self.node_queues[node_name]
+        if node_name in self.node_batch_queues:
+            await queue.put(_END_OF_STREAM)
+        await queue.join()
+        if node_name in self.node_batch_queues:
+            await self.node_batch_queues[node_name].join()
+
+        flush = self.graph._nodes[node_name].flush
+        if flush is not None and not self.halt_pipeline_execution:
+            try:
+                agen = flush()
+            except Exception as exc:
+                self._handle_node_exception(node_name, exc, None)
+            else:
+                node_metrics = None
+                if self.metrics is not None:
+                    node_metrics = self.metrics.nodes[node_name]
+                await self._iterate_node_output(node_name, agen, None, node_metrics)
+
+        self.node_done[node_name].set()
+
+    def _handle_node_exception(self, node_name: str, exc: Exception, item: Any):
+        """Keep track of an unhandled exception from a node, and halt if needed.
+
+        ``item`` is the data item that the node was called with.
+        """
+        self._update_data_flow_error_stats(node_name)
+        # A traceback is only formatted when it's needed,
+        # since formatting is costly when many items fail.
+        formatted_traceback = None
+        if self.executor._compact_exceptions:
+            formatted_traceback = self._update_exception_records(node_name, exc, item)
+        else:
+            self._update_exceptions(node_name, exc)
+        if self._should_log_traceback(node_name, exc):
+            if formatted_traceback is None:
+                formatted_traceback = traceback.format_exc()
+            self.logger.error(formatted_traceback)
+        node = self.graph._nodes[node_name]
+        if self.graph.halt_on_exception or node.halt_on_exception:
+            self.logger.error(
+                f"Pipeline execution halted due to an exception in {node_name} node"
+            )
+            self.halt_pipeline_execution = True
+            self.halted.set()
+
+    async def _iterate_node_output(
+        self,
+        node_name: str,
+        agen: AsyncGenerator,
+        data: Any,
+        node_metrics: _NodeMetrics | None = None,
+    ):
+        """Pass the items yielded by a node's async generator to its destinations.
+
+        ``data`` is the data item that the node was called with.
+        """
+        node_edges = self.graph._nodes_to_edges[node_name]
+        is_start_node = node_name in self.start_node_args
+        fused_node = self.fused_nodes.get(node_name)
+        semaphores = self.node_semaphores.get(node_name)
+        waits_for_in_flight_room = is_start_node and self.in_flight_room is not None
+        # With a scheduling policy, the level of this node if it's below the top
+        priority_level = self.node_priority_levels.get(node_name)
+        if priority_level is not None and priority_level == (
+            len(cast(_PriorityWaits, self.priority_waits).counts) - 1
+        ):
+            priority_level = None
+        if fused_node is not None:
+            fused_node_call = self.node_calls[fused_node]
+            fused_node_metrics = None
+            if self.metrics is not None:
+                fused_node_metrics = self.metrics.nodes[fused_node]
+        if node_metrics is not None:
+            is_first_item = True
+            last_time = time.perf_counter()
+        try:
+            while True:
+                # Stop data yielding/generation if halt_pipeline_execution has
+                # been updated by other nodes, or if a start node is drained
+                if self.halt_pipeline_execution or (is_start_node and self.draining):
+                    await agen.aclose()
+                    break
+
+                if semaphores is not None:
+                    await _acquire_all(semaphores)
+                self.num_running_calls += 1
+                try:
+                    next_data_item = await anext(agen)
+                    if isinstance(next_data_item, BaseException):
+                        raise next_data_item
+                except StopAsyncIteration:
+                    break
+                except Exception as exc:
+                    self._handle_node_exception(node_name, exc, data)
+                    if self.halt_pipeline_execution:
+                        # close current agen
+                        await agen.aclose()
+                        break
+                    else:
+                        continue
+                finally:
+                    if semaphores is not None:
+                        for semaphore in semaphores:
+                            semaphore.release()
+                    self.num_running_calls -= 1
+                    if (
+                        self.running_calls_done is not None
+                        and not self.num_running_calls
+                    ):
+                        self.running_calls_done.set()
+
+                if node_metrics is not None:
+                    # Time spent by the generator itself, not waiting for delivery
+                    duration = time.perf_counter() - last_time
+                    if is_first_item:
+                        node_metrics.time_to_first_yield.record(duration)
+                        is_first_item = False
+                    else:
+                        node_metrics.time_between_yields.record(duration)
+                    node_metrics.items += 1
+
+                self._update_data_flow_in_out_stats(node_name, node_edges)
+                if waits_for_in_flight_room:
+                    # Also before a fused node's call, whose items are in flight
+                    # once they're put into the next node's queue.
+                    await self._wait_for_in_flight_room()
+                if fused_node is None:
+                    await self._add_to_node_queue(node_name, next_data_item)
+                    if priority_level is not None:
+                        await self._give_way_to_higher_priorities(priority_level)
+                else:
+                    await self._call_node(
+                        fused_node, fused_node_call, next_data_item, fused_node_metrics
+                    )
+
+                if node_metrics is not None:
+                    last_time = time.perf_counter()
+        except asyncio.CancelledError:
+            # Cancelled by a halt, possibly while the generator was suspended
+            # at a yield, so that it has to be closed for its cleanup code to run.
+            await agen.aclose()
+            raise
+
+    async def _call_node(
+        self,
+        node_name: str,
+        node_call: Callable[[Any], AsyncGenerator],
+        data: Any,
+        node_metrics: _NodeMetrics | None,
+    ):
+        """Call a node's function with a data item, and pass on its output."""
+        if node_metrics is not None:
+            node_metrics.calls += 1
+        try:
+            agen = node_call(data)
+        except Exception as exc:
+            self._handle_node_exception(node_name, exc, data)
+        else:
+            await self._iterate_node_output(node_name, agen, data, node_metrics)
+
+    def _create_consumer_task(self, node_name: str):
+        i = self.num_consumer_tasks_created.get(node_name, 0)
+        self.num_consumer_tasks_created[node_name] = i + 1
+        task_id = f"{node_name}_{i}"
+        task = asyncio.create_task(self._consumer(node_name, task_id), name=task_id)
+        self.consumer_tasks[task_id] = task
+        if node_name in self.adaptive_tasks:
+            self.adaptive_tasks[node_name].num_tasks += 1
+
+    def _autoscale(self):
+        """Adjust the number of tasks of each node with adaptive tasks.
+
+        This follows additive increase/multiplicative decrease (AIMD):
+        add a task while there's a backlog, and halve the number of tasks
+        once errors or latency go up, e.g., because a downstream service
+        is overloaded. Idle tasks are removed one at a time.
+        """
+        for node_name, adaptive in self.adaptive_tasks.items():
+            node = self.graph._nodes[node_name]
+            queue = self.node_batch_queues.get(node_name, self.node_queues[node_name])
+            min_tasks = cast(int, node.min_tasks)
+
+            num_errors = self.data_flow_stats[node_name]["err"]
+            num_new_errors = num_errors - adaptive.num_errors_seen
+            adaptive.num_errors_seen = num_errors
+            num_calls = adaptive.num_calls
+            latency = adaptive.latency_sum / num_calls if num_calls else None
+            adaptive.num_calls = 0
+            adaptive.latency_sum = 0.0
+
+            target = adaptive.target
+            if latency is not None and (
+                num_new_errors / num_calls > _AUTOSCALE_MAX_ERROR_RATE
+                or (
+                    adaptive.min_latency is not None
+                    and latency > adaptive.min_latency * _AUTOSCALE_MAX_LATENCY_FACTOR
+                )
+            ):
+                target = max(min_tasks, target // 2)
+            elif not queue.empty() and adaptive.num_busy >= adaptive.num_tasks:
+                target = min(node.max_tasks, target + 1)
+            elif queue.empty() and adaptive.num_busy < adaptive.num_tasks:
+                target = max(min_tasks, target - 1)
+
+            if latency is not None and (
+                adaptive.min_latency is None or latency < adaptive.min_latency
+            ):
+                adaptive.min_latency = latency
+
+            if target != adaptive.target:
+                self.logger.debug(
+                    f"{node_name} node - tasks: {adaptive.target} -> {target}"
+                )
+                adaptive.target = target
+            # Cancel the idle tasks over the target right away, so that an idle
+            # node shrinks (and tears down its task-scoped contexts). The busy
+            # tasks over the target retire themselves once they're done with
+            # their current items.
+            while adaptive.num_tasks > target and adaptive.idle_task_ids:
+                task_id = adaptive.idle_task_ids.pop()
+                adaptive.num_tasks -= 1
+                task = self.consumer_tasks.pop(task_id)
+                task.cancel()
+                self.retired_consumer_tasks.append(task)
+            while adaptive.num_tasks < target:
+                self._create_consumer_task(node_name)
+
+    async def _autoscale_periodically(self):
+        """Adjust the numbers of tasks at every time interval until cancelled."""
+        while True:
+            await asyncio.sleep(self.executor._autoscale_interval)
+            if not self.halt_pipeline_execution:
+                self._autoscale()
+
+    async def _consumer(self, node_name: str, task_id: str):
+        """Consume and process data within the graph pipeline."""
+        node_call = self.node_calls[node_name]
+        queue = self.node_batch_queues.get(node_name, self.node_queues[node_name])
+        node_metrics = None
+        if self.metrics is not None:
+            node_metrics = self.metrics.nodes[node_name]
+        put_times = self.node_put_times.get(node_name)
+        is_start_node = node_name in self.start_node_args
+        is_batched = node_name in self.node_batch_queues
+        # Whether the items from this node's queue have been counted in flight
+        # (for a batched node, they're no longer counted once taken by the batcher)
+        is_in_flight_node = node_name in self.in_flight_nodes and not is_batched
+        # With a scheduling policy, the level at which the items from this node's
+        # queue have been counted as waiting (by the batcher for a batched node)
+        queue_priority_level = None
+        if not is_batched:
+            queue_priority_level = self.node_priority_levels.get(node_name)
+        adaptive = self.adaptive_tasks.get(node_name)
+        token_bucket = self.node_token_buckets.get(node_name)
+        node = self.graph._nodes[node_name]
+        node_context = None
+        if node.setup is not None:
+            if node.setup_scope == "node":
+                node_context = self.node_contexts[node_name]
+            else:
+                node_context = _NodeContext(node, self.node_pools.get(node_name))
+        while True:
+            if adaptive is not None and adaptive.num_tasks > adaptive.target:
+                # Retire this task.
+                adaptive.num_tasks -= 1
+                self.retired_consumer_tasks.append(self.consumer_tasks.pop(task_id))
+                break
+
+            if adaptive is not None:
+                adaptive.idle_task_ids.add(task_id)
+            try:
+                if node_metrics is not None and queue.empty():
+                    start_time = time.perf_counter()
+                    data = await queue.get()
+                    node_metrics.get_idle.record(time.perf_counter() - start_time)
+                else:
+                    data = await queue.get()
+            except asyncio.CancelledError:
+                # At the end of the graph execution, or retired by autoscaling
+                break
+            finally:
+                if adaptive is not None:
+                    adaptive.idle_task_ids.discard(task_id)
+            if queue_priority_level is not None:
+                cast(_PriorityWaits, self.priority_waits).remove(queue_priority_level)
+
+            try:
+                if put_times is not None:
+                    wait = time.perf_counter() - put_times.popleft()
+                    cast(_NodeMetrics, node_metrics).queue_wait.record(wait)
+
+                if self.halt_pipeline_execution or (is_start_node and self.draining):
+                    self.num_unprocessed[node_name] += len(data) if is_batched else 1
+                    continue
+
+                if node_context is not None:
+                    try:
+                        node_call = await node_context.get_node_call()
+                    except Exception as exc:
+                        self._handle_node_exception(node_name, exc, data)
+                        continue
+
+                if token_bucket is not None:
+                    await token_bucket.acquire()
+
+                if adaptive is None:
+                    await self._call_node(node_name, node_call, data, node_metrics)
+                else:
+                    adaptive.num_busy += 1
+                    start_time = time.perf_counter()
+                    try:
+                        await self._call_node(node_name, node_call, data, node_metrics)
+                    finally:
+                        adaptive.num_busy -= 1
+                    adaptive.num_calls += 1
+                    adaptive.latency_sum += time.perf_counter() - start_time
+            except asyncio.CancelledError:
+                self.num_unprocessed[node_name] += len(data) if is_batched else 1
+                break
+            finally:
+                # Even when cancelled, so that a custom queue can be joined
+                # in a later graph execution.
+                queue.task_done()
+                if is_in_flight_node:
+                    self._finish_in_flight(1)
+
+        if node_context is not None and node.setup_scope == "task":
+            await self._tear_down(node_name, node_context)
+
+    async def _tear_down(self, node_name: str, node_context: _NodeContext):
+        try:
+            await node_context.close()
+        except Exception:
+            self.logger.error(
+                f"Exception in the teardown of {node_name} node\n"
+                + traceback.format_exc()
+            )
+
+    async def _stop_on_halt(self):
+        """Stop the graph execution right away once halted.
+
+        The node function calls that are running get a grace period to reach
+        their next yield, before all node tasks are cancelled.
+        """
+        await self.halted.wait()
+
+        if self.num_running_calls:
+            self.running_calls_done = asyncio.Event()
+            try:
+                await asyncio.wait_for(
+                    self.running_calls_done.wait(),
+                    timeout=self.executor._halt_grace_period,
+                )
+            except asyncio.TimeoutError:
+                pass
+
+        await self._cancel_node_tasks()
+
+    async def _stop_at_drain_timeout(self):
+        """Stop the graph execution at the timeout of a drain, if any."""
+        await self.drain_requested.wait()
+        if self.drain_timeout is None:
+            await asyncio.Future()  # i.e., wait until cancelled
+        await asyncio.sleep(cast(float, self.drain_timeout))
+        self.logger.warning(
+            f"Graph execution not drained within {self.drain_timeout} seconds"
+        )
+        await self._cancel_node_tasks()
+
+    async def _cancel_node_tasks(self):
+        """Cancel the node tasks, and discard the items that remain in the queues."""
+        for task in self.producer_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.producer_tasks.values(), return_exceptions=True)
+        for task in self.consumer_tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.consumer_tasks.values())
+        for task in self.batcher_tasks:
+            task.cancel()
+        await asyncio.gather(*self.batcher_tasks, return_exceptions=True)
+
+        # Discard the remaining items without passing them through the node tasks.
+        # `task_done` is still called, so that a custom queue can be joined
+        # in a later graph execution.
+        for node_name, queue in self.node_queues.items():
+            for _ in range(queue.qsize()):
+                if queue.get_nowait() is not _END_OF_STREAM:
+                    self.num_unprocessed[node_name] += 1
+                queue.task_done()
+        for node_name, batch_queue in self.node_batch_queues.items():
+            for _ in range(batch_queue.qsize()):
+                self.num_unprocessed[node_name] += len(batch_queue.get_nowait())
+
+    def drain(self, timeout: float | None):
+        """Stop the start nodes, and stop the graph execution at the timeout."""
+        if self.draining:
+            return
+        self.draining = True
+        self.drain_timeout = timeout
+        self.drain_requested.set()
+        # The producers may be waiting for their args iterables (e.g., for messages
+        # from a message queue) or for room in the start nodes' queues.
+        for task in self.producer_tasks.values():
+            task.cancel()
+
+    def _update_data_flow_in_out_stats(self, in_node: str, out_nodes: set[str]):
+        self.data_flow_stats[in_node]["out"] += 1
+        for node in out_nodes:
+            self.data_flow_stats[node]["in"] += 1
+
+    def _update_data_flow_drop_stats(self, node: str):
+        self.data_flow_stats[node]["drop"] += 1
+
+    def _update_data_flow_error_stats(self, node: str):
+        self.data_flow_stats[node]["err"] += 1
+
+    def _update_exceptions(self, node: str, exc: Exception):
+        self.exceptions[node].append(exc)
+
+    def _should_log_traceback(self, node: str, exc: Exception) -> bool:
+        """Whether to log an exception's traceback, under error log throttling.
+
+        Beyond the first tracebacks at a node, the exceptions are counted by
+        signature for the periodic summaries instead.
+        """
+        if not self.executor._error_log_throttling:
+            return True
+        if self.num_logged_tracebacks[node] < self.executor._error_log_max_tracebacks:
+            self.num_logged_tracebacks[node] += 1
+            return True
+        signature = (_exception_type_name(exc), _exception_locations(exc)[-1:])
+        suppressed = self.suppressed_exceptions[node]
+        suppressed[signature] = suppressed.get(signature, 0) + 1
+        return False
+
+    def _log_error_summaries(self):
+        for node, suppressed in self.suppressed_exceptions.items():
+            if not suppressed:
+                continue
+            counts = []
+            for (type_name, locations), count in suppressed.items():
+                if locations:
+                    filename, lineno = locations[0]
+                    counts.append(f"{type_name} at {filename}:{lineno} x{count}")
+                else:
+                    counts.append(f"{type_name} x{count}")
+            self.logger.error(
+                f"{node} node had {sum(suppressed.values())} more exceptions"
+                f" without logged tracebacks: {', '.join(counts)}"
+            )
+            suppressed.clear()
+
+    async def _log_error_summaries_periodically(self):
+        """Log summaries of the exceptions without logged tracebacks until cancelled."""
+        while True:
+            await asyncio.sleep(self.executor._error_log_time_interval)
+            self._log_error_summaries()
+
+    def _update_exception_records(
+        self, node: str, exc: Exception, item: Any
+    ) -> str | None:
+        """Count an exception in its record, or add a record for it.
+
+        Returns the formatted traceback if a record has been added.
+        """
+        type_name = _exception_type_name(exc)
+        message = str(exc)
+        signature = (type_name, message, _exception_locations(exc))
+        records = self.exception_records[node]
+        record = records.get(signature)
+        if record is not None:
+            record.count += 1
+            return None
+        if len(records) >= self.executor._max_exceptions:
+            # Like a full deque, forget the oldest record.
+            del records[next(iter(records))]
+        formatted_traceback = traceback.format_exc()
+        records[signature] = ExceptionRecord(
+            type=type_name,
+            message=message,
+            traceback=formatted_traceback,
+            item=None if item is None else _safe_item_repr(item),
+        )
+        return formatted_traceback
+
+    def _create_node_pool(self, node: _Node) -> concurrent.futures.Executor | None:
+        max_workers = node.max_workers or node.max_tasks
+        if node.executor == "thread":
+            return concurrent.futures.ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix=node.name
+            )
+        elif node.executor == "process":
+            return concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+        return None
+
+    async def run(self):
+        # Start the metrics server first,
+        # so that the graph execution doesn't start if the port isn't available.
+        metrics_server = None
+        if self.executor._metrics_export_port is not None:
+            metrics_server = await asyncio.start_server(
+                self._serve_metrics,
+                self.executor._metrics_export_host,
+                self.executor._metrics_export_port,
+            )
+
+        if self.executor._metrics:
+            self.metrics = _Metrics(self.graph._nodes_to_edges)
+            for node_name, node in self.graph._nodes.items():
+                # Queue wait times can only be matched with items
+                # for first-in-first-out queues that the executor creates.
+                if node.queue is None and not node.is_batched:
+                    self.node_put_times[node_name] = deque()
+
+        for node_name, node in self.graph._nodes.items():
+            pool = self._create_node_pool(node)
+            if pool is not None:
+                self.node_pools[node_name] = pool
+        self.node_calls = {
+            node_name: _compile_node_call(node, self.node_pools.get(node_name))
+            for node_name, node in self.graph._nodes.items()
+        }
+
+        for node_name, node in self.graph._nodes.items():
+            if node.queue is None:
+                queue = asyncio.Queue(maxsize=node.queue_size)
+            else:
+                queue = node.queue
+            self.node_queues[node_name] = queue
+            if node.is_batched:
+                self.node_batch_queues[node_name] = asyncio.Queue(
+                    maxsize=node.max_tasks
+                )
+            self.node_done[node_name] = asyncio.Event()
+            self.data_flow_stats[node_name] = {"in": 0, "out": 0, "err": 0, "drop": 0}
+            self.exceptions[node_name] = deque(maxlen=self.executor._max_exceptions)
+            self.exception_records[node_name] = {}
+            self.num_logged_tracebacks[node_name] = 0
+            self.suppressed_exceptions[node_name] = {}
+            self.num_unprocessed[node_name] = 0
+
+        if self.executor._scheduling is not None:
+            node_priority_levels = self._find_priority_levels()
+            num_priority_levels = len(set(node_priority_levels.values()))
+            # With one level, no node has a higher priority than another.
+            if num_priority_levels > 1:
+                self.node_priority_levels = node_priority_levels
+                self.priority_waits = _PriorityWaits(num_priority_levels)
+
+        self.node_out_edges = {
+            node_name: self._compile_node_out_edges(node_name)
+            for node_name in self.graph._nodes
+        }
+
+        shared_token_buckets = {
+            name: _TokenBucket(limiter.rate, limiter.burst)
+            for name, limiter in self.graph._rate_limiters.items()
+        }
+        for node_name, node in self.graph._nodes.items():
+            if isinstance(node.rate_limit, str):
+                token_bucket = shared_token_buckets[node.rate_limit]
+            elif node.rate_limit is not None:
+                token_bucket = _TokenBucket(
+                    node.rate_limit, cast(int, node.rate_limit_burst)
+                )
+            else:
+                continue
+            self.node_token_buckets[node_name] = token_bucket
+
+        for node_name, node in self.graph._nodes.items():
+            if node.setup is not None and node.setup_scope == "node":
+                self.node_contexts[node_name] = _NodeContext(
+                    node, self.node_pools.get(node_name)
+                )
+
+        semaphores = {
+            name: asyncio.Semaphore(size)
+            for name, size in self.graph._resource_pools.items()
+        }
+        for node_name, node in self.graph._nodes.items():
+            if node.resource_pools is not None:
+                self.node_semaphores[node_name] = tuple(
+                    semaphores[pool_name] for pool_name in node.resource_pools
+                )
+
+        if self.graph.max_in_flight is not None:
+            self.in_flight_room = asyncio.Event()
+            # The edge to the graph outputs goes back to the node itself,
+            # which is excluded either way (a node has no edge to itself).
+            self.in_flight_nodes = {
+                node_name
+                for node_name, node in self.graph._nodes.items()
+                if node_name not in self.start_node_args
+                and (node.queue is None or type(node.queue) in _IN_FLIGHT_QUEUE_TYPES)
+            }
+            self.node_num_in_flight_out_edges = {
+                node_name: sum(
+                    e.dst_node != node_name and e.dst_node in self.in_flight_nodes
+                    for e in out_edges
+                )
+                for node_name, out_edges in self.node_out_edges.items()
+            }
+
+        if self.executor._fuse_chains:
+            self.fused_nodes = self._find_fused_nodes()
+        fused_dst_nodes = set(self.fused_nodes.values())
+
+        for node_name, node in self.graph._nodes.items():
+            if node.is_batched:
+                task = asyncio.create_task(
+                    self._batcher(node_name), name=f"{node_name}_batcher"
+                )
+                self.batcher_tasks.append(task)
+            if node_name in fused_dst_nodes:
+                # The node's function is called by its source node's task.
+                continue
+            num_tasks = node.max_tasks
+            if node.min_tasks is not None:
+                num_tasks = node.min_tasks
+                self.adaptive_tasks[node_name] = _AdaptiveTasks(target=num_tasks)
+            for _ in range(num_tasks):
+                self._create_consumer_task(node_name)
+
+        autoscaling_task = None
+        if self.adaptive_tasks:
+            autoscaling_task = asyncio.create_task(self._autoscale_periodically())
+
+        data_flow_logging_task = None
+        if self.executor._data_flow_logging:
+            data_flow_logging_task = asyncio.create_task(
+                self._log_data_flow_periodically()
+            )
+
+        error_summary_task = None
+        if self.executor._error_log_throttling:
+            error_summary_task = asyncio.create_task(
+                self._log_error_summaries_periodically()
+            )
+
+        metrics_file_task = None
+        if self.executor._metrics_export_path is not None:
+            metrics_file_task = asyncio.create_task(
+                self._write_metrics_file_periodically()
+            )
+
+        queue_sampling_task = None
+        if self.metrics is not None:
+            queue_sampling_task = asyncio.create_task(
+                self._sample_queue_depths_periodically()
+            )
+
+        for node, args in self.start_node_args.items():
+            self.producer_tasks[node] = asyncio.create_task(
+                self._producer(node, args), name=f"{node}_producer"
+            )
+
+        completion_task = asyncio.ensure_future(
+            asyncio.gather(
+                *(
+                    self._wait_for_node_done(node_name)
+                    for node_name in self.graph._nodes
+                )
+            )
+        )
+        # Either of these finishes the graph execution early.
+        halt_task = asyncio.create_task(self._stop_on_halt())
+        drain_task = asyncio.create_task(self._stop_at_drain_timeout())
+        tasks = (completion_task, halt_task, drain_task)
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            # Raise the exception from the graph execution, if any.
+            for task in done:
+                task.result()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            for task in self.producer_tasks.values():
+                task.cancel()
+            await asyncio.gather(*self.producer_tasks.values(), return_exceptions=True)
+
+            for task in self.consumer_tasks.values():
+                task.cancel()
+
+            await asyncio.gather(*self.consumer_tasks.values())
+            # The retired tasks may still be tearing down their contexts.
+            await asyncio.gather(*self.retired_consumer_tasks)
+
+            for task in self.batcher_tasks:
+                task.cancel()
+            await asyncio.gather(*self.batcher_tasks, return_exceptions=True)
+
+            for node_name, node_context in self.node_contexts.items():
+                await self._tear_down(node_name, node_context)
+
+            if data_flow_logging_task is not None:
+                data_flow_logging_task.cancel()
+                await asyncio.gather(data_flow_logging_task, return_exceptions=True)
+
+            if autoscaling_task is not None:
+                autoscaling_task.cancel()
+                await asyncio.gather(autoscaling_task, return_exceptions=True)
+
+            if queue_sampling_task is not None:
+                queue_sampling_task.cancel()
+                await asyncio.gather(queue_sampling_task, return_exceptions=True)
+
+            if error_summary_task is not None:
+                error_summary_task.cancel()
+                await asyncio.gather(error_summary_task, return_exceptions=True)
+                self._log_error_summaries()
+
+            if metrics_file_task is not None:
+                metrics_file_task.cancel()
+                await asyncio.gather(metrics_file_task, return_exceptions=True)
+                await self._write_metrics_file()
+
+            if metrics_server is not None:
+                metrics_server.close()
+                await metrics_server.wait_closed()
+
+            for pool in self.node_pools.values():
+                await asyncio.to_thread(pool.shutdown, cancel_futures=True)
+
+            self.finished.set()
+
+        if self.executor._data_flow_logging:
+            self._log_data_flow_nodes()
+
 
 class AsyncExecutor:
     def __init__(
@@ -23,6 +1705,11 @@ class AsyncExecutor:
         *,
         logger: logging.Logger | None = None,
         max_exceptions: int = 1_000,
+        compact_exceptions: bool = False,
+        halt_grace_period: float = 1.0,
+        fuse_chains: bool = False,
+        autoscale_interval: float = 1.0,
+        scheduling: str | None = None,
     ):
         """Initialize an executor.
 
@@ -37,28 +1724,109 @@ class AsyncExecutor:
             If the number of exceptions at a node exceeds this threshold,
             only the most recent exceptions are kept.
             See also :attr:`~async_graph_data_flow.AsyncExecutor.exceptions`.
+            With ``compact_exceptions=True``, this is the maximum number of
+            distinct exception records to keep track of at each node.
+        compact_exceptions : bool, optional
+            If ``True``, keep track of unhandled exceptions as compact records
+            with identical exceptions counted in one record, instead of
+            the exception objects themselves, which keep their tracebacks' frames
+            (and the data in them) alive.
+            See :attr:`~async_graph_data_flow.AsyncExecutor.exception_records`.
+            The default is ``False``.
+        halt_grace_period : float, optional
+            When the graph execution halts upon an exception,
+            the time in seconds that the running node function calls have
+            to reach their next yield, before they're cancelled
+            and the remaining data items in the queues are discarded.
+            The default is 1 second.
+        fuse_chains : bool, optional
+            If ``True``, optimize linear chains of nodes such as
+            ``node1 -> node2 -> node3``, where each node has ``max_tasks=1``
+            and each edge is the only edge out of its source node and
+            into its destination node: the chain's nodes are run by one task,
+            which calls the next node's function with each item directly,
+            instead of passing the item through the next node's queue.
+            :attr:`~async_graph_data_flow.AsyncExecutor.data_flow_stats` and
+            :attr:`~async_graph_data_flow.AsyncExecutor.exceptions` are still
+            kept for each node.
+            Since the fused nodes no longer run concurrently with each other,
+            this is for nodes that spend little time awaiting.
+            Nodes with a custom queue, batching, a ``flush`` function,
+            ``min_tasks``, ``rate_limit``, ``resource_pools``, ``setup``,
+            or an executor other than ``"async"``,
+            edges with ``on_full`` other than ``"block"``,
+            start nodes (as destination nodes),
+            and output nodes of
+            :meth:`~async_graph_data_flow.AsyncExecutor.iter_outputs`
+            (as source nodes) aren't fused.
+            The default is ``False``.
+        autoscale_interval : float, optional
+            The time interval in seconds between adjustments of the number of tasks
+            of the nodes with ``min_tasks``
+            (see :meth:`~async_graph_data_flow.AsyncGraph.add_node`).
+            The default is 1 second.
+        scheduling : str, optional
+            To favor some nodes over others in the event loop,
+            e.g., to keep the number of items in flight and the latency low
+            by draining the downstream nodes before the upstream nodes
+            fill their queues, set the scheduling policy.
+
+            - ``"priority"``: By the nodes' ``priority`` at
+              :meth:`~async_graph_data_flow.AsyncGraph.add_node`.
+            - ``"downstream_first"``: By the nodes' depths,
+              i.e., the lengths of the longest paths from start nodes to the nodes,
+              so that a node is favored over its source nodes.
+
+            While the nodes with higher priorities have items waiting,
+            a node briefly gives way to them after passing on each item,
+            at the cost of more switches between the nodes' tasks.
+            If not provided (the default), all nodes are on an equal footing.
         """
         self._graph = graph
         if not isinstance(self._graph, AsyncGraph):
             raise TypeError(f"{self._graph} must be an AsyncGraph instance")
+        if scheduling is not None and scheduling not in _SCHEDULING_POLICIES:
+            raise ValueError(
+                f"scheduling must be one of {_SCHEDULING_POLICIES}: {scheduling!r}"
+            )
 
-        self._node_queues: dict[str, asyncio.Queue] = {}
-        self._consumer_tasks: dict[str, asyncio.Task] = {}
-        self._halt_pipeline_execution = False
         self._logger = logger if logger else _LOG
         self._max_exceptions = max_exceptions
+        self._compact_exceptions = compact_exceptions
+        self._halt_grace_period = halt_grace_period
+        self._fuse_chains = fuse_chains
+        self._autoscale_interval = autoscale_interval
+        self._scheduling = scheduling
 
-        self._data_flow_stats: dict[str, dict[str, int]] | None = None
-        self._data_flow_logging_lock = asyncio.Lock()
         self._data_flow_logging = False
         self._data_flow_logging_node_format = _DEFAULT_DATA_FLOW_LOGGING_NODE_FORMAT
         self._data_flow_logging_time_interval = _DEFAULT_DATA_FLOW_LOGGING_TIME_INTERVAL
         self._data_flow_logging_node_filter: Iterable[str] = self._graph._nodes.keys()
-        self._data_flow_logging_last_timestamp = 0.0
 
-        self._start_node_args: dict[str, tuple] | None = None
+        self._error_log_throttling = False
+        self._error_log_max_tracebacks = _DEFAULT_ERROR_LOG_MAX_TRACEBACKS
+        self._error_log_time_interval: float = _DEFAULT_ERROR_LOG_TIME_INTERVAL
+
+        self._start_node_args: dict[str, _StartNodeArgs] | None = None
+
+        self._metrics = False
+        self._metrics_sample_interval = 0.1
+
+        self._metrics_export_host = "127.0.0.1"
+        self._metrics_export_port: int | None = None
+        self._metrics_export_path: str | None = None
+        self._metrics_export_time_interval: float = (
+            _DEFAULT_METRICS_EXPORT_TIME_INTERVAL
+        )
+
+        # The most recently started graph execution.
+        self._execution: _GraphExecution | None = None
+        self._running_executions: set[_GraphExecution] = set()
 
-        self._exceptions: dict[str, deque[Exception]] | None = None
+        self._drain_signals: tuple[signal.Signals, ...] = ()
+        self._drain_signal_timeout: float | None = None
+        self._drain_tasks: set[asyncio.Task] = set()
+        self._signal_handler_signals: tuple[signal.Signals, ...] = ()
 
     @property
     def graph(self) -> AsyncGraph:
@@ -71,31 +1839,64 @@ class AsyncExecutor:
 
         The key is a node by name (str), and the value is the list of exceptions
         raised from the node.
+        If the executor has been run more than once,
+        these are the exceptions from the most recently started run.
+        With ``compact_exceptions=True``, the lists are empty; see
+        :attr:`~async_graph_data_flow.AsyncExecutor.exception_records` instead.
         """
-        if self._exceptions is None:
+        if self._execution is None:
             return None
         from_deque_to_list = {}
-        for node_name, excs in self._exceptions.items():
+        for node_name, excs in self._execution.exceptions.items():
             # `excs` is a deque. Turning it into a list for user-friendliness.
             from_deque_to_list[node_name] = list(excs)
         return from_deque_to_list
 
+    @property
+    def exception_records(self) -> dict[str, list[ExceptionRecord]] | None:
+        """Compact records of the exceptions from the graph execution.
+
+        This is ``None`` unless the executor has ``compact_exceptions=True``.
+        The key is a node by name (str), and the value is the list of
+        :class:`~async_graph_data_flow.executor.ExceptionRecord` objects
+        of the exceptions raised from the node, in the order they were first raised.
+        Exceptions with the same type, message, and traceback share a record,
+        which counts them.
+        If the executor has been run more than once,
+        these are the records from the most recently started run.
+        """
+        if self._execution is None or not self._compact_exceptions:
+            return None
+        return {
+            node_name: list(records.values())
+            for node_name, records in self._execution.exception_records.items()
+        }
+
     @property
     def data_flow_stats(self) -> dict[str, dict[str, int]] | None:
         """Data flow statistics.
 
         These statistics keep track of (i) the number of times data has passed
-        into each node, (ii) the number of times data has come out of each node, and
-        (iii) the number of errors each node has had.
-        The key is a node by name (str), and the value is a dict with three keys (str)
-        of ``"in"``, ``"out"``, and ``"err"``, each corresponding to its count (int)."""
-        return self._data_flow_stats
+        into each node, (ii) the number of times data has come out of each node,
+        (iii) the number of errors each node has had, and (iv) the number of
+        data items discarded at each node's queue because of a full queue
+        (see the ``on_full`` argument of
+        :meth:`~async_graph_data_flow.AsyncGraph.add_edge`).
+        The key is a node by name (str), and the value is a dict with four keys (str)
+        of ``"in"``, ``"out"``, ``"err"``, and ``"drop"``,
+        each corresponding to its count (int).
+        If the executor has been run more than once,
+        these are the statistics of the most recently started run."""
+        if self._execution is None:
+            return None
+        return self._execution.data_flow_stats
 
     @property
-    def start_nodes(self) -> dict[str, tuple]:
+    def start_nodes(self) -> dict[str, _StartNodeArgs]:
         """Start nodes and their arguments.
 
         This is a dictionary that maps each start node (str) to its arguments
+        (or an iterable of arguments)
         to be passed in when the graph execution begins."""
         if self._start_node_args is None:
             self._start_node_args = self._get_start_node_args(None)
@@ -153,165 +1954,175 @@ class AsyncExecutor:
         """Turn off data flow logging."""
         self._data_flow_logging = False
 
-    def _log_data_flow_nodes(self):
-        for node, flow in self._data_flow_stats.items():
-            if (
-                self._data_flow_logging_node_filter
-                and node not in self._data_flow_logging_node_filter
-            ):
-                continue
+    def turn_on_error_log_throttling(
+        self,
+        *,
+        max_tracebacks: int | None = None,
+        time_interval: float | None = None,
+    ) -> None:
+        """Turn on and configure error log throttling.
 
-            self._logger.info(
-                self._data_flow_logging_node_format.format(node=node, **flow)
-            )
+        By default, the traceback of every unhandled exception from a node
+        is logged. When many data items fail (e.g., a downstream service is down),
+        formatting and logging the tracebacks can take up most of the CPU time
+        and flood the logs.
+        With throttling, only the first tracebacks at each node are logged.
+        The other exceptions are counted by type and where they were raised,
+        and the counts are logged as a summary per node
+        at every time interval and when the graph execution ends.
+        :attr:`~async_graph_data_flow.AsyncExecutor.data_flow_stats` still
+        counts all exceptions.
 
-    async def _add_to_node_queue(self, edges: set[str], item: Any):
-        for edge in edges:
-            edge_queue = self._node_queues[edge]
-            await edge_queue.put(item)
+        Parameters
+        ----------
+        max_tracebacks : int, optional
+            The number of tracebacks to log at each node.
+            If not provided, the default is 10.
+        time_interval : float, optional
+            Time interval in seconds between the summaries.
+            If not provided, the default is 60 seconds.
+        """
+        if max_tracebacks is not None and max_tracebacks < 0:
+            raise ValueError(f"max_tracebacks must not be negative: {max_tracebacks}")
+        if time_interval is not None and time_interval <= 0:
+            raise ValueError(f"time_interval must be positive: {time_interval}")
+        self._error_log_throttling = True
+        if max_tracebacks is not None:
+            self._error_log_max_tracebacks = max_tracebacks
+        if time_interval is not None:
+            self._error_log_time_interval = time_interval
 
-    async def _producer(self):
-        """Push args to start nodes' queue in graph to begin pipeline."""
-        for node, args in self._start_node_args.items():
-            queue = self._node_queues[node]
-            await queue.put(args)
+    def turn_off_error_log_throttling(self) -> None:
+        """Turn off error log throttling."""
+        self._error_log_throttling = False
 
-    async def _consumer(self, node_name: str):
-        """Consume and process data within the graph pipeline."""
-        while True:
-            try:
-                if self._data_flow_logging and self._data_flow_logging_last_timestamp:
-                    async with self._data_flow_logging_lock:
-                        current_timestamp = time.time()
-                        if (
-                            current_timestamp - self._data_flow_logging_last_timestamp
-                            > self._data_flow_logging_time_interval
-                        ):
-                            self._log_data_flow_nodes()
-                            self._data_flow_logging_last_timestamp = current_timestamp
-
-                queue = self._node_queues[node_name]
-                data = await queue.get()
-
-                if self._halt_pipeline_execution:
-                    queue.task_done()
-                    continue
+    def turn_on_metrics(self, *, sample_interval: float = 0.1) -> None:
+        """Turn on per-node metrics for the graph executions that start afterwards.
 
-                node = self._graph._nodes[node_name]
-                params = inspect.signature(node.func).parameters
+        See :attr:`~async_graph_data_flow.AsyncExecutor.metrics`.
 
-                try:
-                    if len(params) == 0:
-                        coro = node.func()
-                    elif node.unpack_input and isinstance(data, tuple):
-                        coro = node.func(*data)
-                    elif node.unpack_input and isinstance(data, dict):
-                        coro = node.func(**data)
-                    else:
-                        coro = node.func(data)
-                except asyncio.CancelledError:
-                    continue
-                except Exception as exc:
-                    self._update_data_flow_error_stats(node_name)
-                    self._update_exceptions(node_name, exc)
-                    self._logger.error(traceback.format_exc())
-                    if self._graph.halt_on_exception or node.halt_on_exception:
-                        self._logger.error(
-                            f"Pipeline execution halted due to an exception "
-                            f"in {node_name} node"
-                        )
-                        self._halt_pipeline_execution = True
-                        queue.task_done()
-                    continue
+        Parameters
+        ----------
+        sample_interval : float, optional
+            The time interval (in seconds) to sample the depths of the nodes'
+            queues for their high-water marks. The default is 0.1.
+        """
+        if sample_interval <= 0:
+            raise ValueError(f"sample_interval must be positive: {sample_interval}")
+        self._metrics = True
+        self._metrics_sample_interval = sample_interval
 
-                while True:
-                    try:
-                        # Stop data yielding/generation if _halt_pipeline_execution has
-                        # been updated by other nodes
-                        if self._halt_pipeline_execution:
-                            raise StopAsyncIteration()
-
-                        next_data_item = await anext(coro)
-                        if isinstance(next_data_item, BaseException):
-                            raise next_data_item
-                    except StopAsyncIteration:
-                        break
-                    except asyncio.CancelledError:
-                        break
-                    except Exception as exc:
-                        self._update_data_flow_error_stats(node_name)
-                        self._update_exceptions(node_name, exc)
-                        self._logger.error(traceback.format_exc())
-                        if self._graph.halt_on_exception or node.halt_on_exception:
-                            # close current agen
-                            await coro.aclose()
-
-                            self._logger.error(
-                                f"Pipeline execution halted due to an exception "
-                                f"in {node_name} node"
-                            )
-                            self._halt_pipeline_execution = True
-                            break
-                        else:
-                            continue
-                    else:
-                        node_edges = self._graph._nodes_to_edges[node_name]
-                        self._update_data_flow_in_out_stats(node_name, node_edges)
-                        await self._add_to_node_queue(node_edges, next_data_item)
+    def turn_off_metrics(self) -> None:
+        """Turn off per-node metrics for the graph executions that start afterwards."""
+        self._metrics = False
 
-                queue.task_done()
-            except asyncio.CancelledError:
-                break
+    def turn_on_metrics_exporter(
+        self,
+        *,
+        port: int | None = None,
+        host: str = "127.0.0.1",
+        path: str | None = None,
+        time_interval: float | None = None,
+    ) -> None:
+        """Turn on exporting metrics in the Prometheus text format.
 
-    def _update_data_flow_in_out_stats(self, in_node: str, out_nodes: set[str]):
-        if self._data_flow_stats is None:
-            return None
-        self._data_flow_stats[in_node]["out"] += 1
-        for node in out_nodes:
-            self._data_flow_stats[node]["in"] += 1
+        The exporter is for long-running graph executions
+        that are monitored by pulling metrics.
+        During each graph execution that starts afterwards,
+        either an HTTP server serves the metrics at ``host:port``,
+        or the metrics are written to the file at ``path``
+        at every time interval and once more when the execution ends.
+        Exactly one of ``port`` and ``path`` must be provided.
 
-    def _update_data_flow_error_stats(self, node: str):
-        if self._data_flow_stats is None:
-            return None
-        self._data_flow_stats[node]["err"] += 1
+        The exported metrics are each node's data flow counters
+        (see :attr:`~async_graph_data_flow.AsyncExecutor.data_flow_stats`)
+        and current queue depth, as well as the per-node and per-edge metrics
+        if they're turned on (see
+        :meth:`~async_graph_data_flow.AsyncExecutor.turn_on_metrics`).
+        They're formatted only when requested or written,
+        not as the data items flow through the graph.
 
-    def _update_exceptions(self, node: str, exc: Exception):
-        if self._exceptions is None:
-            return None
-        self._exceptions[node].append(exc)
+        Parameters
+        ----------
+        port : int, optional
+            The port of the HTTP server.
+            Concurrent graph executions by this executor can't share a port.
+        host : str, optional
+            The host of the HTTP server. The default is ``"127.0.0.1"``.
+        path : str, optional
+            The path of the file to write the metrics to.
+        time_interval : float, optional
+            Time interval in seconds between writes to the file.
+            If not provided, the default is 15 seconds.
+        """
+        if (port is None) == (path is None):
+            raise ValueError("exactly one of port and path must be provided")
+        if time_interval is not None and time_interval <= 0:
+            raise ValueError(f"time_interval must be positive: {time_interval}")
+        self._metrics_export_host = host
+        self._metrics_export_port = port
+        self._metrics_export_path = path
+        if time_interval is not None:
+            self._metrics_export_time_interval = time_interval
 
-    async def _pipeline_execution(self):
-        self._data_flow_stats = {}
-        self._exceptions = {}
+    def turn_off_metrics_exporter(self) -> None:
+        """Turn off exporting metrics."""
+        self._metrics_export_port = None
+        self._metrics_export_path = None
 
-        for node_name, node in self._graph._nodes.items():
-            if node.queue is None:
-                queue = asyncio.Queue(maxsize=node.queue_size)
-            else:
-                queue = node.queue
-            self._node_queues[node_name] = queue
-            self._data_flow_stats[node_name] = {"in": 0, "out": 0, "err": 0}
-            self._exceptions[node_name] = deque(maxlen=self._max_exceptions)
+    @property
+    def metrics(self) -> dict[str, Any] | None:
+        """A snapshot of the per-node metrics, if turned on.
 
-            for i in range(node.max_tasks):
-                task_id = f"{node_name}_{i}"
-                task = asyncio.create_task(self._consumer(node_name), name=task_id)
-                self._consumer_tasks[task_id] = task
+        This is ``None`` unless metrics were turned on by
+        :meth:`~async_graph_data_flow.AsyncExecutor.turn_on_metrics`
+        before the graph execution started.
+        The snapshot can be taken during or after a graph execution,
+        and is from the most recently started run.
+        It's a dict with the keys:
 
-        await self._producer()
+        - ``"elapsed"``: Seconds since the graph execution started.
+        - ``"nodes"``: A dict that maps each node by name (str) to its metrics,
+          a dict with the keys:
 
-        for queue in self._node_queues.values():
-            await queue.join()
+          - ``"calls"``: The number of times the node's function has been called.
+          - ``"items"``: The number of items the node has yielded.
+          - ``"items_per_sec"``: ``"items"`` divided by ``"elapsed"``.
+          - ``"time_to_first_yield"``: Seconds from calling the node's function
+            to its first yielded item.
+          - ``"time_between_yields"``: Seconds between the node's yielded items,
+            not counting the time waiting for the destination nodes' queues.
+          - ``"queue_wait"``: Seconds that an item waits in the node's queue.
+            Available for nodes with neither a custom queue nor batching.
+          - ``"get_idle"``: Seconds that the node's tasks wait for an item
+            from the node's empty queue.
+          - ``"queue_depth_max"``: The high-water mark of the node's queue depth,
+            sampled at the interval set by
+            :meth:`~async_graph_data_flow.AsyncExecutor.turn_on_metrics`
+            and whenever the queue is full.
 
-        for task in self._consumer_tasks.values():
-            task.cancel()
+        - ``"edges"``: A dict that maps each source node by name (str)
+          to a dict that maps each of its destination nodes by name (str)
+          to the edge's metrics, a dict with the key:
 
-        await asyncio.gather(*self._consumer_tasks.values())
+          - ``"blocked_put"``: Seconds that the source node waits
+            to put an item into the destination node's full queue.
 
-        if self._data_flow_logging:
-            self._log_data_flow_nodes()
+        ``"time_to_first_yield"``, ``"time_between_yields"``, ``"queue_wait"``,
+        ``"get_idle"``, and ``"blocked_put"`` are histograms,
+        each as a dict with the keys
+        ``"count"``, ``"sum"``, ``"mean"``, ``"p50"``, ``"p90"``, ``"p99"``,
+        and ``"buckets"``; see
+        :meth:`~async_graph_data_flow.metrics.Histogram.snapshot`.
+        Together, ``"get_idle"`` and ``"blocked_put"`` are a map of
+        the graph's backpressure: the nodes downstream of a bottleneck
+        wait for items, while the nodes upstream of it wait to put items.
+        """
+        if self._execution is None or self._execution.metrics is None:
+            return None
+        return self._execution.metrics.snapshot()
 
-    def _get_start_node_args(self, start_node_args) -> dict[str, tuple]:
+    def _get_start_node_args(self, start_node_args) -> dict[str, _StartNodeArgs]:
         if start_node_args is None:
             start_node_args = {node: tuple() for node in self._graph._get_start_nodes()}
         if not start_node_args:
@@ -319,24 +2130,261 @@ class AsyncExecutor:
         for node, args in start_node_args.items():
             if node not in self._graph._nodes:
                 raise ValueError(f"The graph doesn't have the node '{node}'")
-            if not isinstance(args, tuple):
-                raise TypeError(f"args for the node '{node}' isn't a tuple: {args}")
+            if not (
+                isinstance(args, (tuple, AsyncIterable))
+                or (
+                    isinstance(args, Iterable)
+                    and not isinstance(args, (str, bytes, dict))
+                )
+            ):
+                raise TypeError(
+                    f"args for the node '{node}' isn't a tuple or an iterable: {args}"
+                )
         return start_node_args
 
-    def execute(self, start_nodes: dict[str, tuple] | None = None) -> None:
+    async def run(self, start_nodes: dict[str, _StartNodeArgs] | None = None) -> None:
+        """Execute the functions along the graph in the running event loop.
+
+        Unlike :meth:`~async_graph_data_flow.AsyncExecutor.execute`,
+        which starts and closes its own event loop,
+        this coroutine is awaited from async code,
+        e.g., to run a graph inside a web service or to run several graphs
+        in the same event loop.
+        Each run keeps its own state, so the same executor can be run
+        more than once, including concurrently.
+
+        Parameters
+        ----------
+        start_nodes : dict[str, tuple | Iterable | AsyncIterable], optional
+            Same as ``start_nodes`` for
+            :meth:`~async_graph_data_flow.AsyncExecutor.execute`.
+        """
+        await self._run(start_nodes)
+
+    async def _run(
+        self,
+        start_nodes: dict[str, _StartNodeArgs] | None,
+        output_queue: asyncio.Queue | None = None,
+        output_nodes: Iterable[str] = (),
+    ) -> None:
+        start_node_args = self._get_start_node_args(start_nodes)
+        if self._running_executions and any(
+            node.queue is not None for node in self._graph._nodes.values()
+        ):
+            raise RuntimeError(
+                "The graph has nodes with custom queue objects, "
+                "which can't be shared by concurrent runs"
+            )
+        self._start_node_args = start_node_args
+        execution = self._execution = _GraphExecution(
+            self, start_node_args, output_queue, output_nodes
+        )
+        if not self._running_executions:
+            self._add_drain_signal_handlers()
+        self._running_executions.add(execution)
+        try:
+            await execution.run()
+        finally:
+            self._running_executions.discard(execution)
+            if not self._running_executions:
+                self._remove_drain_signal_handlers()
+
+    async def iter_outputs(
+        self,
+        start_nodes: dict[str, _StartNodeArgs] | None = None,
+        *,
+        nodes: Iterable[str] | None = None,
+        maxsize: int = 1_000,
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """Execute the functions along the graph, and iterate over its outputs.
+
+        The items yielded by the output nodes are passed to the caller
+        as the graph execution runs, through a queue with backpressure:
+        once the queue is full, the output nodes wait for the caller to catch up.
+        If the caller stops iterating early, the graph execution is cancelled
+        when the async generator is closed. Since an async generator
+        isn't closed right away at ``break``, use :func:`contextlib.aclosing`
+        to close it (and so to cancel the graph execution) on leaving the block:
+
+        .. code-block:: python
+
+            from contextlib import aclosing
+
+            async with aclosing(executor.iter_outputs()) as outputs:
+                async for node, item in outputs:
+                    ...
+
+        Parameters
+        ----------
+        start_nodes : dict[str, tuple | Iterable | AsyncIterable], optional
+            Same as ``start_nodes`` for
+            :meth:`~async_graph_data_flow.AsyncExecutor.execute`.
+        nodes : Iterable[str], optional
+            The output nodes by name. Their items are still passed on
+            to their destination nodes, if any.
+            If not provided, the nodes without outgoing edges are the output nodes.
+        maxsize : int, optional
+            The maximum number of items in the queue of outputs.
+            The default is 1,000.
+
+        Yields
+        ------
+        tuple[str, Any]
+            The name of the output node and the item it has yielded.
+        """
+        if nodes is None:
+            nodes = [
+                node_name
+                for node_name, dst_nodes in self._graph._nodes_to_edges.items()
+                if not dst_nodes
+            ]
+        else:
+            nodes = list(nodes)
+            for node_name in nodes:
+                if node_name not in self._graph._nodes:
+                    raise ValueError(f"The graph doesn't have the node '{node_name}'")
+        output_queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        run_task = asyncio.create_task(self._run(start_nodes, output_queue, nodes))
+        get_task: asyncio.Future | None = None
+        try:
+            while True:
+                if not output_queue.empty():
+                    yield output_queue.get_nowait()
+                    continue
+                get_task = asyncio.ensure_future(output_queue.get())
+                await asyncio.wait(
+                    (get_task, run_task), return_when=asyncio.FIRST_COMPLETED
+                )
+                if get_task.done():
+                    yield get_task.result()
+                    continue
+                break
+            # The graph execution is done. Pass on the remaining outputs,
+            # and raise the graph execution's exception, if any.
+            get_task.cancel()
+            await asyncio.gather(get_task, return_exceptions=True)
+            while not output_queue.empty():
+                yield output_queue.get_nowait()
+            run_task.result()
+        finally:
+            if get_task is not None and not get_task.done():
+                get_task.cancel()
+                await asyncio.gather(get_task, return_exceptions=True)
+            if not run_task.done():
+                run_task.cancel()
+                await asyncio.gather(run_task, return_exceptions=True)
+
+    async def drain(self, timeout: float | None = None) -> dict[str, int]:
+        """Gracefully stop the running graph executions.
+
+        Draining a graph execution stops its start nodes from producing
+        more data items (and from taking more args from the iterables
+        in ``start_nodes``, even while waiting for the next args),
+        while the other nodes keep processing the items
+        already in the graph (including calling their ``flush`` functions).
+        If the graph execution isn't done by the timeout,
+        its node tasks are cancelled, and the remaining items are discarded.
+
+        This coroutine returns once all the graph executions that were running
+        have finished, and must be awaited in their event loop.
+        See also :meth:`~async_graph_data_flow.AsyncExecutor.turn_on_drain_on_signals`.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            The time in seconds to wait for the graph executions to finish,
+            before cancelling the node tasks.
+            If not provided, the node tasks aren't cancelled.
+
+        Returns
+        -------
+        dict[str, int]
+            For each node by name, the number of data items (or args for
+            a start node) that were not processed, or whose processing
+            was cancelled. These may be sent again after a restart.
+        """
+        executions = list(self._running_executions)
+        for execution in executions:
+            execution.drain(timeout)
+        num_unprocessed = {node_name: 0 for node_name in self._graph._nodes}
+        for execution in executions:
+            await execution.finished.wait()
+            for node_name, num in execution.num_unprocessed.items():
+                num_unprocessed[node_name] += num
+        return num_unprocessed
+
+    def turn_on_drain_on_signals(
+        self,
+        signals: Iterable[signal.Signals] = (signal.SIGTERM,),
+        timeout: float | None = None,
+    ) -> None:
+        """Drain the running graph executions when a signal is received.
+
+        While any graph execution by this executor is running,
+        a handler for each signal is added to the event loop, so that the signal
+        starts :meth:`~async_graph_data_flow.AsyncExecutor.drain`
+        instead of, e.g., terminating the process.
+        The numbers of unprocessed data items are logged as a warning.
+        Signal handlers are only supported on Unix,
+        for an event loop in the main thread.
+
+        Parameters
+        ----------
+        signals : Iterable[signal.Signals], optional
+            The signals to drain upon. The default is ``(signal.SIGTERM,)``.
+        timeout : float, optional
+            Same as ``timeout`` for
+            :meth:`~async_graph_data_flow.AsyncExecutor.drain`.
+        """
+        self._drain_signals = tuple(signals)
+        self._drain_signal_timeout = timeout
+
+    def turn_off_drain_on_signals(self) -> None:
+        """Stop draining the graph executions when a signal is received."""
+        self._drain_signals = ()
+
+    def _add_drain_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in self._drain_signals:
+            loop.add_signal_handler(sig, self._drain_on_signal, sig)
+        self._signal_handler_signals = self._drain_signals
+
+    def _remove_drain_signal_handlers(self):
+        loop = asyncio.get_running_loop()
+        for sig in self._signal_handler_signals:
+            loop.remove_signal_handler(sig)
+        self._signal_handler_signals = ()
+
+    def _drain_on_signal(self, sig: signal.Signals):
+        self._logger.warning(f"Received {sig.name}, draining the graph executions")
+        task = asyncio.create_task(self._log_drain(self._drain_signal_timeout))
+        # Keep a reference to the task until it's done.
+        self._drain_tasks.add(task)
+        task.add_done_callback(self._drain_tasks.discard)
+
+    async def _log_drain(self, timeout: float | None):
+        num_unprocessed = await self.drain(timeout)
+        self._logger.warning(
+            f"Graph executions drained, with unprocessed items: {num_unprocessed}"
+        )
+
+    def execute(self, start_nodes: dict[str, _StartNodeArgs] | None = None) -> None:
         """Start executing the functions along the graph.
 
         Parameters
         ----------
-        start_nodes : dict[str, tuple], optional
+        start_nodes : dict[str, tuple | Iterable | AsyncIterable], optional
             Specify the start node(s), and optionally their arguments.
             Each key in this dictionary is the name (str) of the node function,
             and its corresponding value is the args (tuple)
             (in which case the node function will be called as ``func(*args)``
             -- provide ``None`` if you want ``func()`` with no args).
+            The value can also be an iterable or an async iterable of args,
+            in which case the node function is called once for each args.
+            The args are pulled from the iterable only as there's room
+            in the start node's queue, so that they don't all have to be
+            in memory at once (e.g., a generator that reads lines from a file).
             If ``start_nodes`` is ``None`` or isn't provided,
             nodes that have no incoming edges are treated as start nodes.
         """
-        self._start_node_args = self._get_start_node_args(start_nodes)
-        self._data_flow_logging_last_timestamp = time.time()
-        asyncio.run(self._pipeline_execution())
+        asyncio.run(self.run(start_nodes))
@@ -1,26 +1,64 @@
 import asyncio
 import inspect
 from collections import OrderedDict
-from collections.abc import AsyncGenerator, Callable
+from collections.abc import AsyncGenerator, Awaitable, Callable, Generator
 from typing import Any, NamedTuple
 
 
+_EDGE_ON_FULL_POLICIES = ("block", "drop_newest", "drop_oldest")
+_NODE_EXECUTORS = ("async", "thread", "process")
+_NODE_SETUP_SCOPES = ("task", "node")
+
+
 class InvalidAsyncGraphError(Exception):
     pass
 
 
 class _Node(NamedTuple):
-    func: Callable[..., AsyncGenerator]
+    func: Callable[..., AsyncGenerator] | Callable[..., Generator]
     name: str
     queue: asyncio.Queue | None
     queue_size: int
     max_tasks: int
     halt_on_exception: bool
     unpack_input: bool
+    executor: str
+    max_workers: int | None
+    batch_size: int | None
+    batch_bytes: int | None
+    batch_timeout: float | None
+    flush: Callable[[], AsyncGenerator] | None
+    min_tasks: int | None
+    rate_limit: float | str | None
+    rate_limit_burst: int | None
+    resource_pools: tuple[str, ...] | None
+    setup: Callable[[], Awaitable[Any]] | None
+    teardown: Callable[[Any], Awaitable[None]] | None
+    setup_scope: str
+    priority: int
+
+    @property
+    def is_batched(self) -> bool:
+        batch_limits = (self.batch_size, self.batch_bytes, self.batch_timeout)
+        return any(limit is not None for limit in batch_limits)
+
+
+def _check_rate_limit(rate: float, burst: int) -> None:
+    if rate <= 0:
+        raise ValueError(f"rate limit must be positive: {rate}")
+    if burst < 1:
+        raise ValueError(f"burst must be at least 1: {burst}")
+
+
+class _RateLimiter(NamedTuple):
+    rate: float
+    burst: int
 
 
 class AsyncGraph:
-    def __init__(self, halt_on_exception: bool = False) -> None:
+    def __init__(
+        self, halt_on_exception: bool = False, max_in_flight: int | None = None
+    ) -> None:
         """Initialize a graph.
 
         Parameters
@@ -28,14 +66,84 @@ class AsyncGraph:
         halt_on_exception : bool, optional
             To halt graph execution when *any* node has an unhandled exception,
             set this argument to ``True``. Defaults to ``False``.
+        max_in_flight : int, optional
+            To bound the number of data items in flight in the graph,
+            i.e., the items in the queues of the nodes other than the start nodes
+            and the items being processed by these nodes,
+            set the maximum number.
+            A batched node's items are counted until they're taken into a batch,
+            and the items in a custom ``queue`` of a subclass
+            of :class:`~asyncio.Queue` aren't counted.
+            The start nodes wait to pass on their items while the number of items
+            in flight is at this maximum.
+            Since the other nodes don't wait, the number of items in flight
+            can go over the maximum by the items that the items in flight
+            fan out to.
+            If not provided, the number of items in flight is bounded only by
+            the nodes' queue sizes.
         """
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError(f"max_in_flight must be at least 1: {max_in_flight}")
         self.halt_on_exception = halt_on_exception
+        self.max_in_flight = max_in_flight
         self._nodes: dict[str, _Node] = {}
         self._nodes_to_edges: OrderedDict[str, set[str]] = OrderedDict()
+        self._edges_on_full: dict[tuple[str, str], str] = {}
+        # Reverse mapping of self._nodes_to_edges, for the source nodes of each node.
+        self._nodes_to_sources: dict[str, set[str]] = {}
+        self._start_nodes: set[str] = set()
+        self._rate_limiters: dict[str, _RateLimiter] = {}
+        self._resource_pools: dict[str, int] = {}
+
+    def add_resource_pool(self, name: str, size: int) -> None:
+        """Add a named resource pool to be shared by nodes.
+
+        The nodes with this pool in ``resource_pools`` at
+        :meth:`~async_graph_data_flow.AsyncGraph.add_node`
+        run their functions concurrently no more than ``size`` at a time
+        in total, e.g., for the connections to a database that these nodes query.
+
+        Parameters
+        ----------
+        name : str
+            The name of this resource pool.
+        size : int
+            The number of slots in this resource pool.
+        """
+        if name in self._resource_pools:
+            raise ValueError(f"resource pool '{name}' already exists in the graph")
+        if size < 1:
+            raise ValueError(
+                f"size of resource pool '{name}' must be at least 1: {size}"
+            )
+        self._resource_pools[name] = size
+
+    def add_rate_limiter(self, name: str, rate: float, *, burst: int = 1) -> None:
+        """Add a named rate limiter to be shared by nodes.
+
+        The nodes with ``rate_limit=name`` at
+        :meth:`~async_graph_data_flow.AsyncGraph.add_node`
+        share one token bucket, e.g., for a quota of an API that these nodes call.
+
+        Parameters
+        ----------
+        name : str
+            The name of this rate limiter.
+        rate : float
+            The maximum number of node function calls per second,
+            across all the nodes that use this rate limiter.
+        burst : int, optional
+            The maximum number of calls that can be made at once
+            after the rate limiter has been unused for a while. Defaults to 1.
+        """
+        if name in self._rate_limiters:
+            raise ValueError(f"rate limiter '{name}' already exists in the graph")
+        _check_rate_limit(rate, burst)
+        self._rate_limiters[name] = _RateLimiter(rate=rate, burst=burst)
 
     def add_node(
         self,
-        func: Callable[..., AsyncGenerator],
+        func: Callable[..., AsyncGenerator] | Callable[..., Generator],
         *,
         name: str | None = None,
         halt_on_exception: bool = False,
@@ -44,13 +152,28 @@ class AsyncGraph:
         queue: asyncio.Queue | None = None,
         queue_size: int = 10_000,
         check_async_gen: bool = True,
+        executor: str = "async",
+        max_workers: int | None = None,
+        batch_size: int | None = None,
+        batch_bytes: int | None = None,
+        batch_timeout: float | None = None,
+        flush: Callable[[], AsyncGenerator] | None = None,
+        min_tasks: int | None = None,
+        rate_limit: float | str | None = None,
+        rate_limit_burst: int | None = None,
+        resource_pools: list[str] | None = None,
+        setup: Callable[[], Awaitable[Any]] | None = None,
+        teardown: Callable[[Any], Awaitable[None]] | None = None,
+        setup_scope: str = "task",
+        priority: int = 0,
     ) -> None:
         """Add a node by providing its function and optional configurations.
 
         Parameters
         ----------
-        func : Callable[..., AsyncGenerator]
-            The asynchronous generator function that this node runs.
+        func : Callable[..., AsyncGenerator] | Callable[..., Generator]
+            The asynchronous generator function that this node runs,
+            or a generator function if ``executor`` is ``"thread"`` or ``"process"``.
             See notes below for the function's requirements.
         name : str, optional
             The name of this node. If not provided, the ``__name__`` attribute
@@ -89,6 +212,126 @@ class AsyncGraph:
             Pass in ``False`` to disable this check if ``func`` would fail the check
             while the callable under the hood is still an async generator function
             (e.g., your function is wrapped by a decorator).
+            If ``executor`` is ``"thread"`` or ``"process"``, ``func`` is verified
+            to be a generator function by :func:`inspect.isgeneratorfunction` instead.
+        executor : str, optional
+            Where this node's function runs.
+
+            - ``"async"`` (the default): In the event loop.
+            - ``"thread"``: In a :class:`~concurrent.futures.ThreadPoolExecutor`,
+              for blocking code (e.g., a synchronous database driver)
+              that would otherwise block the event loop.
+              ``func`` must be a (synchronous) generator function.
+              The items that ``func`` yields are passed on to the graph
+              as they come.
+            - ``"process"``: In a :class:`~concurrent.futures.ProcessPoolExecutor`,
+              for CPU-bound work that would otherwise block the event loop.
+              ``func`` must be a (synchronous) generator function that can be
+              pickled, e.g., defined at the top level of a module, and it is called
+              with picklable arguments. For each input, the items that ``func``
+              yields are held in the worker process and sent back to the graph
+              once ``func`` has finished with this input,
+              so they must fit in memory.
+              If ``func`` raises an exception, the items that it yielded before
+              are still passed on, as with the other executors.
+        max_workers : int, optional
+            The number of worker threads or processes
+            if ``executor`` is ``"thread"`` or ``"process"``, respectively.
+            If not provided, it is the same as ``max_tasks``,
+            which sets how many inputs this node processes at a time.
+        batch_size : int, optional
+            To have this node's function called with a list of items
+            instead of one item at a time, set the maximum number of items
+            in a list (batch).
+            Each batch is as large as possible without going over
+            any of ``batch_size``, ``batch_bytes``, and ``batch_timeout``,
+            and the last batch is passed on once all source nodes are done.
+            Batching can't be used with a custom ``queue``.
+        batch_bytes : int, optional
+            The maximum size of a batch in bytes.
+            The size of an item is ``len(item)`` for ``str``, ``bytes``,
+            and ``bytearray``, or else :func:`sys.getsizeof`.
+            A batch has at least one item, even if the item is larger than this.
+        batch_timeout : float, optional
+            The maximum time in seconds that a batch waits for more items,
+            counting from its first item.
+        flush : Callable[[], AsyncGenerator], optional
+            An asynchronous generator function with no arguments,
+            called once at the end of this node's data stream,
+            i.e., after all of this node's source nodes are done
+            and this node has processed all of its items.
+            The items that ``flush`` yields are passed on to the destination nodes
+            just like the items from ``func``.
+            This is useful for nodes that hold on to data across items,
+            e.g., to aggregate data or to write data in chunks.
+        min_tasks : int, optional
+            To have the number of this node's concurrent tasks adapt at runtime,
+            set the minimum number of tasks, with ``max_tasks`` as the maximum.
+            The node starts with ``min_tasks`` tasks.
+            At every time interval (see ``autoscale_interval`` at
+            :class:`~async_graph_data_flow.AsyncExecutor`),
+            one task is added if items are waiting in the node's queue
+            while all tasks are busy,
+            the number of tasks is halved if the node's error rate or latency
+            has gone up (e.g., a downstream service is overloaded),
+            and one task is removed if tasks are idle.
+            This is useful for a node that calls a service
+            whose capacity varies.
+        rate_limit : float | str, optional
+            To limit how often this node's function is called
+            (e.g., for an API with a quota), either the maximum number of calls
+            per second, or the name of a rate limiter from
+            :meth:`~async_graph_data_flow.AsyncGraph.add_rate_limiter`
+            to share with other nodes.
+            The limit is enforced by a token bucket across all of this node's tasks,
+            before each call (or each batch if the node is batched).
+            Under sustained load, calls are made at the rate,
+            with no bursts over it.
+        rate_limit_burst : int, optional
+            The maximum number of calls that can be made at once
+            after the node has been idle for a while, if ``rate_limit`` is a number.
+            Defaults to 1.
+        resource_pools : list[str], optional
+            The names of the resource pools from
+            :meth:`~async_graph_data_flow.AsyncGraph.add_resource_pool`
+            that this node uses.
+            This node's function runs only while it holds a slot of each pool,
+            i.e., a slot is held from each time the function is called or resumed
+            until its next yield (or return), and not while its items wait
+            for room in the destination nodes' queues,
+            so that the nodes sharing a pool can't block each other for good.
+            The slots of multiple pools are acquired in the order of the pools'
+            names, to avoid deadlocks between nodes.
+        setup : Callable[[], Awaitable[Any]], optional
+            An asynchronous function with no arguments that returns a context
+            for this node's function, e.g., an HTTP session or a database connection
+            that is expensive to create for every item.
+            The context is passed to this node's function
+            as its first positional argument, before the arguments from the item.
+            ``setup`` is called before the first item of each of this node's tasks,
+            or of the node if ``setup_scope`` is ``"node"``.
+            If ``setup`` raises an exception, the exception is handled
+            as if this node's function had raised it with the item,
+            and ``setup`` is called again for the next item.
+            ``setup`` can't be used with the ``"process"`` executor.
+        teardown : Callable[[Any], Awaitable[None]], optional
+            An asynchronous function that is called with the context from ``setup``
+            to clean it up, at the end of each of this node's tasks,
+            or at the end of the graph execution if ``setup_scope`` is ``"node"``.
+            An exception from ``teardown`` is logged.
+        setup_scope : str, optional
+            Which of this node's function calls share a context from ``setup``.
+
+            - ``"task"`` (the default): The calls by each of this node's tasks,
+              e.g., for a database connection that can't be used concurrently.
+            - ``"node"``: All calls of this node in the graph execution,
+              e.g., for an HTTP session with a connection pool.
+        priority : int, optional
+            This node's priority if ``scheduling`` is ``"priority"`` at
+            :class:`~async_graph_data_flow.AsyncExecutor`.
+            While the nodes with higher priorities have items waiting,
+            this node briefly gives way to them after passing on each item.
+            Defaults to 0.
 
         Notes
         -----
@@ -96,7 +339,8 @@ class AsyncGraph:
         argument ``unpack_input``.
 
         * Each function in the graph must be an **asynchronous generator function**,
-          i.e., it's defined by ``async def`` and it yields.
+          i.e., it's defined by ``async def`` and it yields
+          (unless the node runs its function elsewhere, see ``executor`` above).
 
         * Each function can have any signature,
           with no arguments or with any valid argument types
@@ -142,12 +386,73 @@ class AsyncGraph:
         """  # noqa: E501
 
         name = name or func.__name__
-        if check_async_gen and not inspect.isasyncgenfunction(func):
-            raise TypeError(f"node '{name}' isn't an async generator function")
+        if executor not in _NODE_EXECUTORS:
+            raise ValueError(f"executor must be one of {_NODE_EXECUTORS}: {executor!r}")
+        if check_async_gen:
+            if executor == "async" and not inspect.isasyncgenfunction(func):
+                raise TypeError(f"node '{name}' isn't an async generator function")
+            elif executor != "async" and not inspect.isgeneratorfunction(func):
+                raise TypeError(f"node '{name}' isn't a generator function")
         if name in self._nodes:
             raise ValueError(f"node '{name}' already exists in the graph")
         if queue is not None and not isinstance(queue, asyncio.Queue):
             raise TypeError(f"queue must be an instance of asyncio.Queue: {queue}")
+        for arg_name, arg_value in (
+            ("batch_size", batch_size),
+            ("batch_bytes", batch_bytes),
+            ("batch_timeout", batch_timeout),
+        ):
+            if arg_value is not None and arg_value <= 0:
+                raise ValueError(f"{arg_name} must be positive: {arg_value}")
+        if queue is not None and (batch_size or batch_bytes or batch_timeout):
+            raise ValueError("batching can't be used with a custom queue")
+        if (
+            flush is not None
+            and check_async_gen
+            and not inspect.isasyncgenfunction(flush)
+        ):
+            raise TypeError(f"flush of node '{name}' isn't an async generator function")
+        if min_tasks is not None and not 1 <= min_tasks <= max_tasks:
+            raise ValueError(
+                f"min_tasks must be between 1 and max_tasks ({max_tasks}): {min_tasks}"
+            )
+        if isinstance(rate_limit, str):
+            if rate_limit not in self._rate_limiters:
+                raise ValueError(
+                    f"rate limiter '{rate_limit}' not registered in the graph"
+                )
+            if rate_limit_burst is not None:
+                raise ValueError(
+                    "rate_limit_burst can't be used with a named rate limiter"
+                )
+        elif rate_limit is not None:
+            if rate_limit_burst is None:
+                rate_limit_burst = 1
+            _check_rate_limit(rate_limit, rate_limit_burst)
+        elif rate_limit_burst is not None:
+            raise ValueError("rate_limit_burst requires rate_limit")
+        if setup_scope not in _NODE_SETUP_SCOPES:
+            raise ValueError(
+                f"setup_scope must be one of {_NODE_SETUP_SCOPES}: {setup_scope!r}"
+            )
+        if setup is not None:
+            if executor == "process":
+                raise ValueError("setup can't be used with the process executor")
+            if check_async_gen and not inspect.iscoroutinefunction(setup):
+                raise TypeError(f"setup of node '{name}' isn't a coroutine function")
+        if teardown is not None:
+            if setup is None:
+                raise ValueError("teardown requires setup")
+            if check_async_gen and not inspect.iscoroutinefunction(teardown):
+                raise TypeError(f"teardown of node '{name}' isn't a coroutine function")
+        sorted_resource_pools = None
+        if resource_pools is not None:
+            for pool_name in resource_pools:
+                if pool_name not in self._resource_pools:
+                    raise ValueError(
+                        f"resource pool '{pool_name}' not registered in the graph"
+                    )
+            sorted_resource_pools = tuple(sorted(set(resource_pools)))
         self._nodes[name] = _Node(
             func=func,
             name=name,
@@ -156,13 +461,31 @@ class AsyncGraph:
             max_tasks=max_tasks,
             halt_on_exception=halt_on_exception,
             unpack_input=unpack_input,
+            executor=executor,
+            max_workers=max_workers,
+            batch_size=batch_size,
+            batch_bytes=batch_bytes,
+            batch_timeout=batch_timeout,
+            flush=flush,
+            min_tasks=min_tasks,
+            rate_limit=rate_limit,
+            rate_limit_burst=rate_limit_burst,
+            resource_pools=sorted_resource_pools,
+            setup=setup,
+            teardown=teardown,
+            setup_scope=setup_scope,
+            priority=priority,
         )
         self._nodes_to_edges[name] = set()
+        self._nodes_to_sources[name] = set()
+        self._start_nodes.add(name)
 
     def add_edge(
         self,
         src_node: str | Callable[..., AsyncGenerator],
         dst_node: str | Callable[..., AsyncGenerator],
+        *,
+        on_full: str = "block",
     ) -> None:
         """Add an edge.
 
@@ -172,7 +495,26 @@ class AsyncGraph:
             The source node, either the function name or the function itself.
         dst_node : str | Callable[..., AsyncGenerator]
             The destination node, either the function name or the function itself.
+        on_full : str, optional
+            What to do with an item yielded by the source node
+            when the destination node's queue is full.
+
+            - ``"block"`` (the default): Wait until the queue has room for the item.
+            - ``"drop_newest"``: Discard the item.
+            - ``"drop_oldest"``: Discard the oldest item in the queue
+              to make room for the item.
+
+            When the source node has multiple destination nodes, an item is put into
+            all queues with room right away, and the source node waits only for
+            the full queues whose edges block.
+            Discarded items are counted in
+            :attr:`~async_graph_data_flow.AsyncExecutor.data_flow_stats`.
         """
+        if on_full not in _EDGE_ON_FULL_POLICIES:
+            raise ValueError(
+                f"on_full must be one of {_EDGE_ON_FULL_POLICIES}: {on_full!r}"
+            )
+
         if not isinstance(src_node, str):
             src_node = src_node.__name__
         if src_node not in self._nodes:
@@ -183,11 +525,14 @@ class AsyncGraph:
         if dst_node not in self._nodes:
             raise ValueError(f"dst_node '{dst_node}' not registered in the graph")
 
-        self._nodes_to_edges[src_node].add(dst_node)
-
-        if self._is_graph_cyclic():
+        if self._has_path(dst_node, src_node):
             raise InvalidAsyncGraphError("Graph has a cycle")
 
+        self._nodes_to_edges[src_node].add(dst_node)
+        self._nodes_to_sources[dst_node].add(src_node)
+        self._start_nodes.discard(dst_node)
+        self._edges_on_full[(src_node, dst_node)] = on_full
+
     @property
     def nodes(self) -> list[dict[str, Any]]:
         """The list of nodes, each with its function and configurations."""
@@ -207,61 +552,43 @@ class AsyncGraph:
         """The mapping between source nodes and their destination nodes."""
         return dict(self._nodes_to_edges)
 
-    def _graph_validator(
-        self,
-        i: int,
-        is_checked: list[bool],
-        iter_stack: list[bool],
-        graph: dict[str, set[str]],
-    ) -> bool:
-        """Code based on: https://www.geeksforgeeks.org/detect-cycle-in-a-graph/"""
-        # Use the OrderedDict self._nodes_to_edges for its ordering.
-        nodes = list(self._nodes_to_edges.keys())
-        is_checked[i] = True
-        iter_stack[i] = True
-
-        try:
-            dst_nodes = graph[nodes[i]]
-        except KeyError:
-            iter_stack[i] = False
-            return False
-
-        for dst_node in dst_nodes:
-            try:
-                edge_pos = nodes.index(dst_node)
-            except ValueError:
-                iter_stack[i] = False
-                return False
-
-            if not is_checked[edge_pos] and self._graph_validator(
-                edge_pos, is_checked, iter_stack, graph
-            ):
-                return True
-            elif iter_stack[edge_pos]:
-                return True
-
-        iter_stack[i] = False
-        return False
+    def _has_path(self, src_node: str, dst_node: str) -> bool:
+        """Check whether dst_node is reachable from src_node along the edges.
 
-    def _is_graph_cyclic(self) -> bool:
-        """Code based on: https://www.geeksforgeeks.org/detect-cycle-in-a-graph/"""
-        iter_stack = is_checked = [False] * (len(self._nodes) + 1)
-        for i in range(len(self._nodes)):
-            if not is_checked[i] and self._graph_validator(
-                i, is_checked, iter_stack, self._nodes_to_edges
-            ):
-                return True
+        Adding an edge from X to Y creates a cycle if and only if X is
+        reachable from Y, so only this part of the graph needs to be traversed
+        for each new edge.
+        """
+        if src_node == dst_node:
+            return True
+        visited = {src_node}
+        stack = [src_node]
+        while stack:
+            for next_node in self._nodes_to_edges[stack.pop()]:
+                if next_node == dst_node:
+                    return True
+                if next_node not in visited:
+                    visited.add(next_node)
+                    stack.append(next_node)
         return False
 
+    def _get_node_depths(self) -> dict[str, int]:
+        """Find the length of the longest path from a start node to each node."""
+        num_sources = {
+            node_name: len(sources)
+            for node_name, sources in self._nodes_to_sources.items()
+        }
+        depths = dict.fromkeys(self._nodes, 0)
+        # Visit the nodes in topological order.
+        stack = list(self._start_nodes)
+        while stack:
+            node_name = stack.pop()
+            for dst_node in self._nodes_to_edges[node_name]:
+                depths[dst_node] = max(depths[dst_node], depths[node_name] + 1)
+                num_sources[dst_node] -= 1
+                if not num_sources[dst_node]:
+                    stack.append(dst_node)
+        return depths
+
     def _get_start_nodes(self) -> set[str]:
-        root_nodes = set()
-        for src_node in self._nodes_to_edges.keys():
-            root_node = True
-            for dst_nodes in self._nodes_to_edges.values():
-                if src_node in dst_nodes:
-                    root_node = False
-                    break
-
-            if root_node:
-                root_nodes.add(src_node)
-        return root_nodes
+        return set(self._start_nodes)
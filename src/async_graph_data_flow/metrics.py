@@ -0,0 +1,290 @@
+import math
+import time
+from bisect import bisect_left
+from typing import Any
+
+
+# Upper bounds (in seconds) of the histogram buckets, from 1 microsecond to 100 seconds
+# fmt: off
+DEFAULT_BUCKETS: tuple[float, ...] = (
+    1e-06, 2e-06, 5e-06,
+    1e-05, 2e-05, 5e-05,
+    0.0001, 0.0002, 0.0005,
+    0.001, 0.002, 0.005,
+    0.01, 0.02, 0.05,
+    0.1, 0.2, 0.5,
+    1.0, 2.0, 5.0,
+    10.0, 20.0, 50.0,
+    100.0,
+)
+# fmt: on
+
+
+class Histogram:
+    """A histogram of durations with fixed buckets.
+
+    Recording a value only increments counters,
+    so that a histogram can be updated for every item at little cost.
+    """
+
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: tuple[float, ...] = DEFAULT_BUCKETS):
+        """Initialize a histogram.
+
+        Parameters
+        ----------
+        bounds : tuple[float, ...], optional
+            The sorted upper bounds of the buckets.
+            Values greater than the last bound are counted in an extra bucket.
+            If not provided, the default is from 1 microsecond to 100 seconds
+            in steps of 1, 2, and 5.
+        """
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def record(self, value: float) -> None:
+        """Record a value."""
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float | None:
+        """Estimate a quantile by the upper bound of the bucket it falls in.
+
+        Returns ``None`` if no values have been recorded,
+        and ``inf`` if the quantile is greater than the last bound.
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            if cumulative >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict[str, Any]:
+        """Return the histogram's current data.
+
+        The dict has the keys ``"count"``, ``"sum"``, ``"mean"``,
+        ``"p50"``, ``"p90"``, ``"p99"``, and ``"buckets"``
+        (a list of ``(upper_bound, count)`` with ``inf`` for the last bucket).
+        """
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else None,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "buckets": list(zip(self.bounds + (float("inf"),), self.counts)),
+        }
+
+
+class _NodeMetrics:
+    """Per-node instrumentation of one graph execution."""
+
+    __slots__ = (
+        "calls",
+        "items",
+        "time_to_first_yield",
+        "time_between_yields",
+        "queue_wait",
+        "get_idle",
+        "queue_depth_max",
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.items = 0
+        self.time_to_first_yield = Histogram()
+        self.time_between_yields = Histogram()
+        self.queue_wait = Histogram()
+        self.get_idle = Histogram()
+        self.queue_depth_max = 0
+
+    def snapshot(self, elapsed: float) -> dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "items": self.items,
+            "items_per_sec": self.items / elapsed if elapsed > 0 else 0.0,
+            "time_to_first_yield": self.time_to_first_yield.snapshot(),
+            "time_between_yields": self.time_between_yields.snapshot(),
+            "queue_wait": self.queue_wait.snapshot(),
+            "get_idle": self.get_idle.snapshot(),
+            "queue_depth_max": self.queue_depth_max,
+        }
+
+
+class _EdgeMetrics:
+    """Per-edge instrumentation of one graph execution."""
+
+    __slots__ = ("blocked_put",)
+
+    def __init__(self):
+        self.blocked_put = Histogram()
+
+    def snapshot(self) -> dict[str, Any]:
+        return {"blocked_put": self.blocked_put.snapshot()}
+
+
+class _Metrics:
+    """Instrumentation of one graph execution."""
+
+    def __init__(self, nodes_to_edges: dict[str, set[str]]):
+        self.start_time = time.perf_counter()
+        self.nodes = {node_name: _NodeMetrics() for node_name in nodes_to_edges}
+        self.edges = {
+            src_node: {dst_node: _EdgeMetrics() for dst_node in dst_nodes}
+            for src_node, dst_nodes in nodes_to_edges.items()
+        }
+
+    def snapshot(self) -> dict[str, Any]:
+        elapsed = time.perf_counter() - self.start_time
+        return {
+            "elapsed": elapsed,
+            "nodes": {
+                node_name: node_metrics.snapshot(elapsed)
+                for node_name, node_metrics in self.nodes.items()
+            },
+            "edges": {
+                src_node: {
+                    dst_node: edge_metrics.snapshot()
+                    for dst_node, edge_metrics in dst_nodes.items()
+                }
+                for src_node, dst_nodes in self.edges.items()
+            },
+        }
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_PROMETHEUS_PREFIX = "async_graph_data_flow"
+
+_DATA_FLOW_COUNTERS = (
+    ("in", "node_in_total", "Data items that have come into the node."),
+    ("out", "node_out_total", "Data items that have come out of the node."),
+    ("err", "node_errors_total", "Unhandled exceptions from the node."),
+    ("drop", "node_dropped_total", "Data items discarded at the node's full queue."),
+)
+
+_NODE_HISTOGRAMS = (
+    ("time_to_first_yield", "Time from calling the node's function to its first item."),
+    ("time_between_yields", "Time between the items yielded by the node's function."),
+    ("queue_wait", "Time an item waits in the node's queue."),
+    ("get_idle", "Time the node's tasks wait for an item from the empty queue."),
+)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    return ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in labels.items())
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_bound(bound: float) -> str:
+    # Bucket bounds are always formatted as floats, so that the "le" labels of
+    # a histogram are consistent even if custom bounds are ints.
+    if math.isinf(bound):
+        return "+Inf"
+    return repr(float(bound))
+
+
+def _format_prometheus(
+    data_flow_stats: dict[str, dict[str, int]],
+    queue_depths: dict[str, int],
+    metrics: dict[str, Any] | None = None,
+) -> str:
+    """Format a graph execution's statistics in the Prometheus text format.
+
+    Parameters
+    ----------
+    data_flow_stats : dict[str, dict[str, int]]
+        The ``data_flow_stats`` of the graph execution.
+    queue_depths : dict[str, int]
+        The current number of items in each node's queue.
+    metrics : dict[str, Any], optional
+        The ``metrics`` snapshot of the graph execution, if metrics are on.
+
+    Returns
+    -------
+    str
+    """
+    lines = []
+
+    def add_metric(name, metric_type, help_text, samples):
+        full_name = f"{_PROMETHEUS_PREFIX}_{name}"
+        lines.append(f"# HELP {full_name} {help_text}")
+        lines.append(f"# TYPE {full_name} {metric_type}")
+        for suffix, labels, value in samples:
+            label_text = _format_labels(labels)
+            lines.append(f"{full_name}{suffix}{{{label_text}}} {_format_value(value)}")
+
+    def histogram_samples(histogram, labels):
+        cumulative = 0
+        for bound, count in histogram["buckets"]:
+            cumulative += count
+            yield "_bucket", {**labels, "le": _format_bound(bound)}, cumulative
+        yield "_sum", labels, float(histogram["sum"])
+        yield "_count", labels, histogram["count"]
+
+    for key, name, help_text in _DATA_FLOW_COUNTERS:
+        samples = [
+            ("", {"node": node}, flow[key]) for node, flow in data_flow_stats.items()
+        ]
+        add_metric(name, "counter", help_text, samples)
+
+    samples = [("", {"node": node}, depth) for node, depth in queue_depths.items()]
+    add_metric("queue_depth", "gauge", "Data items in the node's queue.", samples)
+
+    if metrics is not None:
+        nodes = metrics["nodes"]
+        samples = [("", {"node": node}, m["calls"]) for node, m in nodes.items()]
+        add_metric("node_calls_total", "counter", "Node function calls.", samples)
+        samples = [("", {"node": node}, m["items"]) for node, m in nodes.items()]
+        add_metric("node_items_total", "counter", "Items yielded by the node.", samples)
+        samples = [
+            ("", {"node": node}, m["queue_depth_max"]) for node, m in nodes.items()
+        ]
+        add_metric(
+            "queue_depth_max",
+            "gauge",
+            "Sampled high-water mark of the node's queue depth.",
+            samples,
+        )
+        for key, help_text in _NODE_HISTOGRAMS:
+            samples = [
+                sample
+                for node, m in nodes.items()
+                for sample in histogram_samples(m[key], {"node": node})
+            ]
+            add_metric(f"node_{key}_seconds", "histogram", help_text, samples)
+        samples = [
+            sample
+            for src_node, dst_nodes in metrics["edges"].items()
+            for dst_node, m in dst_nodes.items()
+            for sample in histogram_samples(
+                m["blocked_put"], {"src": src_node, "dst": dst_node}
+            )
+        ]
+        add_metric(
+            "edge_blocked_put_seconds",
+            "histogram",
+            "Time the source node waits to put an item into the full queue.",
+            samples,
+        )
+
+    lines.append("")
+    return "\n".join(lines)
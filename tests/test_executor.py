@@ -1,5 +1,13 @@
 import asyncio
+import inspect
+import os
+import signal
+import socket
+import sys
+import threading
 import time
+from contextlib import aclosing
+from unittest import mock
 
 import pytest
 
@@ -469,3 +477,1718 @@ def test_graph_with_no_edges():
 
     executor.execute(start_nodes={"node1": ("foo",)})
     assert executor.start_nodes == {"node1": ("foo",)}
+
+
+def test_node_signature_inspected_once_per_execution():
+    async def node1():
+        for i in range(100):
+            yield i
+
+    async def node2(data):
+        yield data
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    with mock.patch(
+        "async_graph_data_flow.executor.inspect.signature", wraps=inspect.signature
+    ) as mock_signature:
+        executor = AsyncExecutor(graph)
+        executor.execute()
+
+    assert mock_signature.call_count == 2
+    assert executor.data_flow_stats["node2"].get("out") == 100
+
+
+def test_data_flow_logging_at_time_interval(caplog):
+    async def node1():
+        for i in range(3):
+            await asyncio.sleep(0.4)
+            yield i
+
+    async def node2(data):
+        yield data
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+    executor.turn_on_data_flow_logging(node_filter=["node2"], time_interval=1)
+    with caplog.at_level("INFO", logger="async_graph_data_flow.executor"):
+        executor.execute()
+
+    # One periodic log after 1 second, and one final log at the end of execution.
+    assert [r.getMessage() for r in caplog.records] == [
+        " node2 - in=2, out=2, err=0",
+        " node2 - in=3, out=3, err=0",
+    ]
+
+
+@pytest.mark.parametrize(
+    "on_full, expected_slow_items",
+    [("block", [1, 2, 3, 4, 5]), ("drop_newest", [1]), ("drop_oldest", [5])],
+)
+def test_edge_on_full(on_full, expected_slow_items):
+    fast_items = []
+    slow_items = []
+
+    async def extract():
+        for i in range(1, 6):
+            yield i
+
+    async def fast(data):
+        fast_items.append(data)
+        yield
+
+    async def slow(data):
+        await asyncio.sleep(0.01)
+        slow_items.append(data)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(extract)
+    graph.add_node(fast)
+    graph.add_node(slow, queue=asyncio.Queue(maxsize=1))
+    graph.add_edge("extract", "fast")
+    graph.add_edge("extract", "slow", on_full=on_full)
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert fast_items == [1, 2, 3, 4, 5]
+    assert slow_items == expected_slow_items
+
+    expected_drop = 5 - len(expected_slow_items)
+    assert executor.data_flow_stats["fast"] == {"in": 5, "out": 5, "err": 0, "drop": 0}
+    assert executor.data_flow_stats["slow"] == {
+        "in": 5,
+        "out": len(expected_slow_items),
+        "err": 0,
+        "drop": expected_drop,
+    }
+
+
+def test_run_in_existing_event_loop():
+    results = []
+
+    async def node1(n):
+        for i in range(n):
+            yield i
+
+    async def node2(data):
+        results.append(data)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        await asyncio.gather(
+            executor.run(start_nodes={"node1": (3,)}),
+            executor.run(start_nodes={"node1": (5,)}),
+        )
+
+    asyncio.run(main())
+
+    assert sorted(results) == [0, 0, 1, 1, 2, 2, 3, 4]
+    # The statistics are from the most recently started run.
+    assert executor.start_nodes == {"node1": (5,)}
+    assert executor.data_flow_stats["node2"] == {"in": 5, "out": 5, "err": 0, "drop": 0}
+
+
+def test_run_concurrently_with_custom_queue():
+    async def node1():
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1, queue=asyncio.Queue())
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        await asyncio.gather(executor.run(), executor.run())
+
+    with pytest.raises(RuntimeError) as excinfo:
+        asyncio.run(main())
+    assert "custom queue" in str(excinfo.value)
+
+
+def _square_numbers(n):
+    # A generator function at the top level of the module,
+    # so that it can be pickled and sent to worker processes.
+    for i in range(n):
+        yield i * i
+    if n == 3:
+        raise ValueError("bad number: 3")
+
+
+def test_process_pool_node():
+    results = []
+
+    async def extract():
+        for n in range(1, 5):
+            yield n
+
+    async def load(data):
+        results.append(data)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(extract)
+    graph.add_node(_square_numbers, executor="process", max_tasks=2)
+    graph.add_node(load)
+    graph.add_edge("extract", "_square_numbers")
+    graph.add_edge("_square_numbers", "load")
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    # The items yielded for n=3 before the exception are passed on.
+    assert sorted(results) == [0, 0, 0, 0, 1, 1, 1, 4, 4, 9]
+    assert executor.data_flow_stats["_square_numbers"] == {
+        "in": 4,
+        "out": 10,
+        "err": 1,
+        "drop": 0,
+    }
+    assert [str(e) for e in executor.exceptions["_square_numbers"]] == ["bad number: 3"]
+
+
+def test_thread_pool_node():
+    results = []
+    thread_names = set()
+
+    async def extract():
+        yield 3
+        yield 5_000
+
+    def read_rows(n):
+        thread_names.add(threading.current_thread().name)
+        for i in range(n):
+            if n == 3:
+                # Blocking calls don't block the event loop.
+                time.sleep(0.01)
+            yield i
+        if n == 3:
+            raise ValueError("bad number: 3")
+
+    async def load(data):
+        results.append(data)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(extract)
+    graph.add_node(read_rows, executor="thread", max_tasks=2)
+    graph.add_node(load)
+    graph.add_edge("extract", "read_rows")
+    graph.add_edge("read_rows", "load")
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert sorted(results) == sorted([0, 1, 2] + list(range(5_000)))
+    assert all(name.startswith("read_rows") for name in thread_names)
+    assert executor.data_flow_stats["read_rows"] == {
+        "in": 2,
+        "out": 5_003,
+        "err": 1,
+        "drop": 0,
+    }
+    assert [str(e) for e in executor.exceptions["read_rows"]] == ["bad number: 3"]
+
+
+def test_thread_pool_node_stopped_on_halt():
+    rows_read = []
+
+    def read_rows():
+        for i in range(10_000):
+            rows_read.append(i)
+            yield i
+
+    async def load(data):
+        if data == 10:
+            raise ValueError("bad data: 10")
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(read_rows, executor="thread")
+    graph.add_node(load, halt_on_exception=True, queue=asyncio.Queue(maxsize=1))
+    graph.add_edge("read_rows", "load")
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    # The worker thread stops soon after the halt,
+    # instead of running the generator to completion.
+    assert len(rows_read) < 10_000
+
+
+def test_nodes_added_in_reverse_order():
+    results = []
+
+    async def load(data):
+        results.append(data)
+        yield
+
+    async def transform(data):
+        yield data
+
+    async def extract():
+        for i in range(5):
+            yield i
+
+    graph = AsyncGraph()
+    graph.add_node(load)
+    graph.add_node(transform)
+    graph.add_node(extract)
+    graph.add_edge(extract, transform)
+    graph.add_edge(transform, load)
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert results == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.parametrize(
+    "batch_kwargs, expected_batches",
+    [
+        ({"batch_size": 4}, [[0, 1, 2, 3], [4, 5, 6, 7], [8, 9]]),
+        ({"batch_bytes": 5}, [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9]]),
+        ({"batch_size": 4, "batch_bytes": 3}, [[0, 1, 2], [3, 4, 5], [6, 7, 8], [9]]),
+        ({"batch_timeout": 60}, [list(range(10))]),
+    ],
+)
+def test_batching(batch_kwargs, expected_batches):
+    batches = []
+
+    async def data_source():
+        for i in range(10):
+            yield str(i)
+
+    async def batched_inputs(data):
+        batches.append([int(x) for x in data])
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(data_source)
+    graph.add_node(batched_inputs, **batch_kwargs)
+    graph.add_edge(data_source, batched_inputs)
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert batches == expected_batches
+    assert executor.data_flow_stats["batched_inputs"]["in"] == 10
+    assert executor.data_flow_stats["batched_inputs"]["out"] == len(expected_batches)
+
+
+def test_batching_with_timeout():
+    batches = []
+
+    async def data_source():
+        for i in range(5):
+            yield i
+        await asyncio.sleep(0.3)
+        for i in range(5, 8):
+            yield i
+
+    async def batched_inputs(data):
+        batches.append(data)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(data_source)
+    graph.add_node(batched_inputs, batch_size=100, batch_timeout=0.1)
+    graph.add_edge(data_source, batched_inputs)
+
+    AsyncExecutor(graph).execute()
+
+    # The first batch doesn't wait for more items beyond the timeout.
+    assert batches == [[0, 1, 2, 3, 4], [5, 6, 7]]
+
+
+def test_node_flush():
+    totals = []
+
+    async def extract1():
+        for i in range(1, 4):
+            await asyncio.sleep(0.01)
+            yield i
+
+    async def extract2():
+        yield 10
+
+    class Sum:
+        total = 0
+
+        @classmethod
+        async def add(cls, number):
+            cls.total += number
+            return
+            yield
+
+        @classmethod
+        async def flush(cls):
+            # Called once both extract1 and extract2 are done.
+            yield cls.total
+
+    async def report(total):
+        totals.append(total)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(extract1)
+    graph.add_node(extract2)
+    graph.add_node(Sum.add, name="sum", max_tasks=2, flush=Sum.flush)
+    graph.add_node(report)
+    graph.add_edge(extract1, "sum")
+    graph.add_edge(extract2, "sum")
+    graph.add_edge("sum", report)
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert totals == [16]
+    assert executor.data_flow_stats["sum"] == {"in": 4, "out": 1, "err": 0, "drop": 0}
+
+
+def test_node_flush_with_exception():
+    async def node1():
+        yield
+
+    async def flush():
+        raise ValueError("bad flush")
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1, flush=flush)
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert executor.data_flow_stats["node1"] == {"in": 0, "out": 1, "err": 1, "drop": 0}
+    assert [str(e) for e in executor.exceptions["node1"]] == ["bad flush"]
+
+
+def test_calling_node_func_with_exception_without_halt():
+    async def node1():
+        yield 1, 2
+        yield 1, 2, 3
+
+    async def node2(foo, bar, baz):
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert executor.data_flow_stats["node2"] == {"in": 2, "out": 1, "err": 1, "drop": 0}
+
+
+def test_metrics():
+    async def node1():
+        for i in range(5):
+            yield i
+
+    async def node2(data):
+        await asyncio.sleep(0.01)
+        yield data
+        yield data
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+    assert executor.metrics is None
+    executor.turn_on_metrics()
+    executor.execute()
+
+    metrics = executor.metrics
+    assert metrics["elapsed"] > 0
+    node1_metrics = metrics["nodes"]["node1"]
+    node2_metrics = metrics["nodes"]["node2"]
+    assert (node1_metrics["calls"], node1_metrics["items"]) == (1, 5)
+    assert (node2_metrics["calls"], node2_metrics["items"]) == (5, 10)
+    assert node2_metrics["items_per_sec"] > 0
+    assert node1_metrics["time_to_first_yield"]["count"] == 1
+    assert node1_metrics["time_between_yields"]["count"] == 4
+    assert node2_metrics["time_to_first_yield"]["count"] == 5
+    assert node2_metrics["time_to_first_yield"]["p50"] >= 0.01
+    assert node2_metrics["time_between_yields"]["count"] == 5
+    assert node1_metrics["queue_wait"]["count"] == 1
+    assert node2_metrics["queue_wait"]["count"] == 5
+    assert sum(c for _, c in node2_metrics["queue_wait"]["buckets"]) == 5
+
+    executor.turn_off_metrics()
+    executor.execute()
+    assert executor.metrics is None
+
+
+def test_metrics_backpressure():
+    async def node1():
+        for i in range(5):
+            yield i
+
+    async def node2(data):
+        await asyncio.sleep(0.02)
+        yield data
+
+    async def node3(data):
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, queue_size=1)
+    graph.add_node(node3)
+    graph.add_edge("node1", "node2")
+    graph.add_edge("node2", "node3")
+
+    executor = AsyncExecutor(graph)
+    executor.turn_on_metrics(sample_interval=0.005)
+    executor.execute()
+
+    metrics = executor.metrics
+    # node1 is blocked by node2's full queue, and node3 waits for node2.
+    blocked_put = metrics["edges"]["node1"]["node2"]["blocked_put"]
+    assert blocked_put["count"] >= 3
+    assert blocked_put["sum"] > 0.04
+    assert metrics["edges"]["node2"]["node3"]["blocked_put"]["count"] == 0
+    assert metrics["nodes"]["node2"]["queue_depth_max"] == 1
+    assert metrics["nodes"]["node3"]["get_idle"]["count"] >= 5
+    assert metrics["nodes"]["node3"]["get_idle"]["sum"] > 0.08
+
+
+def test_turn_on_metrics_with_invalid_sample_interval():
+    executor = AsyncExecutor(AsyncGraph())
+    with pytest.raises(ValueError, match="sample_interval must be positive: 0"):
+        executor.turn_on_metrics(sample_interval=0)
+
+
+def test_metrics_exporter_to_file(tmp_path):
+    async def node1():
+        for i in range(3):
+            yield i
+
+    async def node2(data):
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    path = tmp_path / "metrics.prom"
+    executor = AsyncExecutor(graph)
+    executor.turn_on_metrics()
+    executor.turn_on_metrics_exporter(path=str(path))
+    executor.execute()
+
+    text = path.read_text()
+    assert 'async_graph_data_flow_node_in_total{node="node2"} 3' in text
+    assert 'async_graph_data_flow_node_out_total{node="node1"} 3' in text
+    assert 'async_graph_data_flow_queue_depth{node="node2"} 0' in text
+    assert 'async_graph_data_flow_node_calls_total{node="node2"} 3' in text
+    assert (
+        'async_graph_data_flow_node_queue_wait_seconds_bucket{node="node2",le="+Inf"} 3'
+        in text
+    )
+    assert (
+        "async_graph_data_flow_node_queue_wait_seconds_bucket"
+        '{node="node2",le="5e-06"} ' in text
+    )
+    assert (
+        "async_graph_data_flow_node_queue_wait_seconds_bucket"
+        '{node="node2",le="1.0"} ' in text
+    )
+    assert (
+        "async_graph_data_flow_node_queue_wait_seconds_bucket"
+        '{node="node2",le="100.0"} 3' in text
+    )
+    assert (
+        "async_graph_data_flow_edge_blocked_put_seconds_count"
+        '{src="node1",dst="node2"} 0' in text
+    )
+
+
+def test_metrics_exporter_http_server():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    responses = []
+
+    async def node1():
+        yield
+
+    async def node2(data):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        await writer.drain()
+        responses.append(await reader.read())
+        writer.close()
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+    executor.turn_on_metrics_exporter(port=port)
+    executor.execute()
+
+    header, body = responses[0].split(b"\r\n\r\n", 1)
+    assert header.startswith(b"HTTP/1.1 200 OK")
+    assert b'async_graph_data_flow_node_in_total{node="node2"} 1' in body
+    # Per-node latency metrics are only exported if metrics are on.
+    assert b"async_graph_data_flow_node_calls_total" not in body
+
+
+@pytest.mark.parametrize(
+    "kwargs, expected_error",
+    [
+        ({}, "exactly one of port and path must be provided"),
+        ({"port": 9000, "path": "foo"}, "exactly one of port and path"),
+        ({"path": "foo", "time_interval": 0}, "time_interval must be positive: 0"),
+    ],
+)
+def test_turn_on_metrics_exporter_with_invalid_args(kwargs, expected_error):
+    executor = AsyncExecutor(AsyncGraph())
+    with pytest.raises(ValueError, match=expected_error):
+        executor.turn_on_metrics_exporter(**kwargs)
+
+
+def test_compact_exceptions():
+    async def node1():
+        for i in range(5):
+            yield "x" * 1_000 if i == 4 else i
+
+    async def node2(data):
+        if data == 0:
+            raise KeyError("foo")
+        raise ValueError("bad data")
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph, compact_exceptions=True)
+    assert executor.exception_records is None
+    executor.execute()
+
+    assert executor.data_flow_stats["node2"]["err"] == 5
+    assert executor.exceptions == {"node1": [], "node2": []}
+    assert executor.exception_records["node1"] == []
+    record1, record2 = executor.exception_records["node2"]
+    assert (record1.type, record1.message, record1.item, record1.count) == (
+        "builtins.KeyError",
+        "'foo'",
+        "0",
+        1,
+    )
+    assert (record2.type, record2.message, record2.item, record2.count) == (
+        "builtins.ValueError",
+        "bad data",
+        "1",
+        4,
+    )
+    assert record2.traceback.startswith("Traceback")
+    assert 'raise ValueError("bad data")' in record2.traceback
+
+
+def test_compact_exceptions_max_exceptions():
+    async def node1():
+        for i in range(3):
+            yield i
+
+    async def node2(data):
+        raise ValueError(f"bad data {data}")
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph, max_exceptions=2, compact_exceptions=True)
+    executor.execute()
+
+    records = executor.exception_records["node2"]
+    assert [record.message for record in records] == ["bad data 1", "bad data 2"]
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+    assert executor.exception_records is None
+
+
+def test_error_log_throttling(caplog):
+    async def node1():
+        for i in range(10):
+            yield i
+
+    async def node2(data):
+        if data % 2:
+            raise ValueError(f"bad data {data}")
+        raise KeyError(data)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+    executor.turn_on_error_log_throttling(max_tracebacks=3)
+    executor.execute()
+
+    assert executor.data_flow_stats["node2"]["err"] == 10
+    error_logs = [r.getMessage() for r in caplog.records if r.levelname == "ERROR"]
+    assert len(error_logs) == 4
+    assert all(log.startswith("Traceback") for log in error_logs[:3])
+    assert error_logs[3].startswith(
+        "node2 node had 7 more exceptions without logged tracebacks: "
+    )
+    assert "builtins.ValueError at " in error_logs[3]
+    assert "x4" in error_logs[3]
+    assert "builtins.KeyError at " in error_logs[3]
+    assert "x3" in error_logs[3]
+
+
+def test_error_log_throttling_periodic_summaries(caplog):
+    async def node1():
+        for i in range(2):
+            await asyncio.sleep(0.3)
+            yield i
+
+    async def node2(data):
+        raise ValueError
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+    executor.turn_on_error_log_throttling(max_tracebacks=0, time_interval=0.2)
+    executor.execute()
+
+    summaries = [r.getMessage() for r in caplog.records if r.levelname == "ERROR"]
+    assert len(summaries) == 2
+    assert all(
+        summary.startswith("node2 node had 1 more exceptions") for summary in summaries
+    )
+
+
+def test_halt_cancels_running_node_calls():
+    cleanup = []
+
+    async def node1():
+        yield "slow"
+        yield "bad"
+
+    async def node2(data):
+        if data == "bad":
+            await asyncio.sleep(0.1)
+            raise ValueError("bad data")
+        try:
+            yield "started"
+            await asyncio.sleep(60)
+            yield "finished"
+        finally:
+            cleanup.append(data)
+
+    async def node3(data):
+        await asyncio.sleep(60)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, max_tasks=2, halt_on_exception=True)
+    graph.add_node(node3, queue_size=10_000)
+    graph.add_edge("node1", "node2")
+    graph.add_edge("node2", "node3")
+
+    executor = AsyncExecutor(graph, halt_grace_period=0.1)
+    start = time.perf_counter()
+    executor.execute()
+
+    assert time.perf_counter() - start < 1
+    assert cleanup == ["slow"]
+    assert executor.data_flow_stats["node2"] == {"in": 2, "out": 1, "err": 1, "drop": 0}
+    assert [str(e) for e in executor.exceptions["node2"]] == ["bad data"]
+
+
+def test_halt_discards_queued_items_of_custom_queue():
+    async def node1():
+        for i in range(1_000):
+            yield i
+
+    async def node2(data):
+        raise ValueError("bad data")
+        yield
+
+    queue = asyncio.Queue()
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, queue=queue, halt_on_exception=True)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        await executor.run()
+        assert executor.data_flow_stats["node2"]["err"] == 1
+        assert queue.empty()
+
+        # The queue is reusable, i.e., a later graph execution doesn't wait
+        # forever for the discarded items to be processed.
+        await asyncio.wait_for(executor.run(), timeout=5)
+        assert executor.data_flow_stats["node2"]["err"] == 1
+
+    asyncio.run(main())
+
+
+def test_drain():
+    flushed = []
+
+    async def node1():
+        i = 0
+        while True:
+            await asyncio.sleep(0.01)
+            yield i
+            i += 1
+
+    async def node2(data):
+        await asyncio.sleep(0.02)
+        yield
+
+    async def flush():
+        flushed.append(True)
+        return
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, flush=flush)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        run_task = asyncio.create_task(executor.run())
+        await asyncio.sleep(0.2)
+        num_unprocessed = await executor.drain(timeout=5)
+        assert run_task.done()
+        return num_unprocessed
+
+    assert asyncio.run(main()) == {"node1": 0, "node2": 0}
+    stats = executor.data_flow_stats
+    # All items from node1 were processed by node2.
+    assert stats["node1"]["out"] == stats["node2"]["in"] > 0
+    assert flushed == [True]
+
+
+def test_drain_with_timeout():
+    async def node1():
+        for i in range(10):
+            yield i
+
+    async def node2(data):
+        await asyncio.sleep(60)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, max_tasks=2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        asyncio.create_task(executor.run())
+        await asyncio.sleep(0.1)
+        return await executor.drain(timeout=0.1)
+
+    assert asyncio.run(main()) == {"node1": 0, "node2": 10}
+
+
+def test_drain_with_timeout_with_batched_node():
+    processed = []
+
+    async def node1():
+        for i in range(100):
+            yield i
+
+    async def node2(batch):
+        await asyncio.sleep(1)
+        processed.extend(batch)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, batch_size=10)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        asyncio.create_task(executor.run())
+        await asyncio.sleep(0.1)
+        return await executor.drain(timeout=0.3)
+
+    num_unprocessed = asyncio.run(main())
+    # Including the batch that the batcher was holding when cancelled
+    assert len(processed) + num_unprocessed["node2"] == 100
+    assert executor.data_flow_stats["node2"]["in"] == 100
+
+
+def test_halt_with_blocked_start_node_args():
+    async def node1_args():
+        yield (1,)
+        # e.g., waiting for a message that doesn't come
+        await asyncio.sleep(10)
+        yield (2,)
+
+    async def node1(data):
+        raise ValueError("bad data")
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1, halt_on_exception=True)
+
+    executor = AsyncExecutor(graph, logger=mock.MagicMock())
+    start_time = time.perf_counter()
+    executor.execute({"node1": node1_args()})
+
+    assert time.perf_counter() - start_time < 5
+    assert executor.data_flow_stats["node1"]["err"] == 1
+
+
+@pytest.mark.parametrize("timeout", [None, 0.2])
+def test_drain_with_blocked_start_node_args(timeout):
+    async def node1_args():
+        yield (1,)
+        # e.g., waiting for a message that doesn't come
+        await asyncio.sleep(10)
+        yield (2,)
+
+    async def node1(data):
+        yield data
+
+    async def node2(data):
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        run_task = asyncio.create_task(executor.run({"node1": node1_args()}))
+        await asyncio.sleep(0.05)
+        num_unprocessed = await asyncio.wait_for(executor.drain(timeout), 5)
+        await run_task
+        return num_unprocessed
+
+    assert asyncio.run(main()) == {"node1": 0, "node2": 0}
+    assert executor.data_flow_stats["node2"]["in"] == 1
+
+
+def test_drain_without_running_graph_execution():
+    executor = AsyncExecutor(AsyncGraph())
+    assert asyncio.run(executor.drain()) == {}
+
+
+@pytest.mark.skipif(
+    sys.platform == "win32", reason="signal handlers are only supported on Unix"
+)
+def test_drain_on_signals(caplog):
+    async def node1():
+        i = 0
+        while True:
+            await asyncio.sleep(0.01)
+            yield i
+            i += 1
+            if i == 5:
+                os.kill(os.getpid(), signal.SIGUSR1)
+
+    async def node2(data):
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+    executor.turn_on_drain_on_signals([signal.SIGUSR1], timeout=5)
+    executor.execute()
+
+    assert executor.data_flow_stats["node2"]["in"] >= 5
+    warnings = [r.getMessage() for r in caplog.records if r.levelname == "WARNING"]
+    assert warnings == [
+        "Received SIGUSR1, draining the graph executions",
+        "Graph executions drained, with unprocessed items: {'node1': 0, 'node2': 0}",
+    ]
+    # The signal handler is removed after the graph execution.
+    assert signal.getsignal(signal.SIGUSR1) is signal.SIG_DFL
+
+
+def test_start_nodes_with_iterables_of_args():
+    results = []
+    num_pulled = 0
+
+    def sync_args():
+        nonlocal num_pulled
+        for i in range(100):
+            num_pulled += 1
+            yield (i,)
+
+    async def async_args():
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield (i, i)
+
+    async def node1(data):
+        # The args are pulled lazily, as there's room in the queue.
+        assert num_pulled <= data + 3
+        await asyncio.sleep(0)
+        yield data
+
+    async def node2(a, b):
+        yield a + b
+
+    async def node3(data):
+        results.append(data)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1, queue_size=2)
+    graph.add_node(node2)
+    graph.add_node(node3)
+    graph.add_edge("node1", "node3")
+    graph.add_edge("node2", "node3")
+
+    executor = AsyncExecutor(graph)
+    executor.execute(start_nodes={"node1": sync_args(), "node2": async_args()})
+
+    assert sorted(results) == sorted(list(range(100)) + [0, 2, 4])
+    assert executor.data_flow_stats["node1"]["out"] == 100
+    assert executor.data_flow_stats["node2"]["out"] == 3
+
+
+def test_start_nodes_with_iterable_of_invalid_args():
+    async def node1(data):
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+
+    executor = AsyncExecutor(graph)
+    with pytest.raises(TypeError, match="args for the node 'node1' isn't a tuple: 1"):
+        executor.execute(start_nodes={"node1": [(0,), 1]})
+    with pytest.raises(TypeError, match="isn't a tuple or an iterable: foo"):
+        executor.execute(start_nodes={"node1": "foo"})
+
+
+def test_iter_outputs():
+    async def node1():
+        for i in range(5):
+            yield i
+
+    async def node2(data):
+        yield data * 10
+
+    async def node3(data):
+        yield -data
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_node(node3)
+    graph.add_edge("node1", "node2")
+    graph.add_edge("node1", "node3")
+
+    executor = AsyncExecutor(graph)
+
+    async def collect(**kwargs):
+        return [output async for output in executor.iter_outputs(**kwargs)]
+
+    outputs = asyncio.run(collect(maxsize=1))
+    assert sorted(outputs) == sorted(
+        [("node2", i * 10) for i in range(5)] + [("node3", -i) for i in range(5)]
+    )
+
+    outputs = asyncio.run(collect(nodes=["node1"]))
+    assert outputs == [("node1", i) for i in range(5)]
+    # The items are still passed on to the destination nodes.
+    assert executor.data_flow_stats["node2"]["in"] == 5
+
+
+def test_iter_outputs_stopped_early():
+    async def node1():
+        i = 0
+        while True:
+            yield i
+            i += 1
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        outputs = []
+        async with aclosing(executor.iter_outputs(maxsize=2)) as agen:
+            async for _, item in agen:
+                outputs.append(item)
+                if item == 9:
+                    break
+        # The graph execution has been cancelled on leaving the block.
+        assert not executor._running_executions
+        assert not [
+            task for task in asyncio.all_tasks() if task is not asyncio.current_task()
+        ]
+        return outputs
+
+    assert asyncio.run(main()) == list(range(10))
+    # With backpressure, node1 didn't get ahead of the caller by much.
+    assert executor.data_flow_stats["node1"]["out"] <= 13
+
+
+def test_iter_outputs_leaves_no_tasks():
+    async def node1():
+        for i in range(3):
+            await asyncio.sleep(0.01)
+            yield i
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        outputs = [item async for _, item in executor.iter_outputs()]
+        # The pending get from the queue of outputs has been awaited, too.
+        assert not [
+            task for task in asyncio.all_tasks() if task is not asyncio.current_task()
+        ]
+        return outputs
+
+    assert asyncio.run(main()) == [0, 1, 2]
+
+
+def test_iter_outputs_with_unknown_node():
+    executor = AsyncExecutor(AsyncGraph())
+
+    async def main():
+        async for _ in executor.iter_outputs(nodes=["node1"]):
+            pass
+
+    with pytest.raises(ValueError, match="The graph doesn't have the node 'node1'"):
+        asyncio.run(main())
+
+
+def test_fuse_chains():
+    results = []
+
+    async def node1():
+        for i in range(5):
+            yield i
+
+    async def node2(data):
+        if data == 2:
+            raise ValueError("bad data")
+        yield data + 1
+
+    async def node3(data):
+        yield data * 10
+
+    async def node4(data):
+        results.append(data)
+        yield
+
+    async def node5(data):
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_node(node3)
+    graph.add_node(node4)
+    graph.add_node(node5)
+    graph.add_edge("node1", "node2")
+    graph.add_edge("node2", "node3")
+    graph.add_edge("node3", "node4")
+    graph.add_edge("node3", "node5")
+
+    executor = AsyncExecutor(graph, fuse_chains=True)
+    with mock.patch("asyncio.create_task", wraps=asyncio.create_task) as create_task:
+        executor.execute()
+
+    assert sorted(results) == [10, 20, 40, 50]
+    assert executor.data_flow_stats == {
+        "node1": {"in": 0, "out": 5, "err": 0, "drop": 0},
+        "node2": {"in": 5, "out": 4, "err": 1, "drop": 0},
+        "node3": {"in": 4, "out": 4, "err": 0, "drop": 0},
+        "node4": {"in": 4, "out": 4, "err": 0, "drop": 0},
+        "node5": {"in": 4, "out": 4, "err": 0, "drop": 0},
+    }
+    assert [str(e) for e in executor.exceptions["node2"]] == ["bad data"]
+    # node2 and node3 are run by node1's task, while node3 has two destinations.
+    task_names = {call.kwargs.get("name") for call in create_task.call_args_list}
+    assert {"node1_0", "node4_0", "node5_0"} <= task_names
+    assert not {"node2_0", "node3_0"} & task_names
+
+
+def test_fuse_chains_with_halt():
+    async def node1():
+        for i in range(5):
+            yield i
+
+    async def node2(data):
+        if data == 2:
+            raise ValueError("bad data")
+        yield data
+
+    async def node3(data):
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, halt_on_exception=True)
+    graph.add_node(node3)
+    graph.add_edge("node1", "node2")
+    graph.add_edge("node2", "node3")
+
+    executor = AsyncExecutor(graph, fuse_chains=True)
+    executor.execute()
+
+    assert executor.data_flow_stats["node1"]["out"] == 3
+    assert executor.data_flow_stats["node3"]["in"] == 2
+
+
+def test_min_tasks_scale_up():
+    max_concurrency = 0
+    concurrency = 0
+
+    async def node1():
+        for i in range(40):
+            yield i
+
+    async def node2(data):
+        nonlocal concurrency, max_concurrency
+        concurrency += 1
+        max_concurrency = max(max_concurrency, concurrency)
+        await asyncio.sleep(0.01)
+        concurrency -= 1
+        yield data
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, max_tasks=4, min_tasks=1)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph, autoscale_interval=0.02)
+    executor.execute()
+
+    assert executor.data_flow_stats["node2"] == {
+        "in": 40,
+        "out": 40,
+        "err": 0,
+        "drop": 0,
+    }
+    assert max_concurrency == 4
+
+
+def test_min_tasks_scale_down_when_idle():
+    idle_samples = []
+    torn_down = []
+
+    async def setup():
+        return object()
+
+    async def teardown(context):
+        torn_down.append(context)
+
+    async def node1():
+        for i in range(40):
+            yield i
+        # An idle period, with no items for node2
+        for _ in range(10):
+            await asyncio.sleep(0.05)
+            idle_samples.append((adaptive.num_tasks, len(torn_down)))
+
+    async def node2(context, data):
+        await asyncio.sleep(0.01)
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, max_tasks=4, min_tasks=1, setup=setup, teardown=teardown)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph, autoscale_interval=0.02)
+    adaptive = None
+
+    async def main():
+        nonlocal adaptive
+        run_task = asyncio.create_task(executor.run())
+        await asyncio.sleep(0)
+        (execution,) = executor._running_executions
+        adaptive = execution.adaptive_tasks["node2"]
+        await run_task
+        return execution.num_consumer_tasks_created["node2"]
+
+    num_tasks_created = asyncio.run(main())
+
+    assert num_tasks_created > 1
+    # The idle tasks were retired (and their contexts torn down)
+    # without waiting for more items.
+    assert idle_samples[-1] == (1, num_tasks_created - 1)
+    assert len(torn_down) == num_tasks_created
+
+
+def test_min_tasks_scale_down_on_errors():
+    concurrency_at_calls = []
+    concurrency = 0
+
+    async def node1():
+        for i in range(60):
+            yield i
+
+    async def node2(data):
+        nonlocal concurrency
+        concurrency += 1
+        concurrency_at_calls.append(concurrency)
+        await asyncio.sleep(0.01)
+        concurrency -= 1
+        if data >= 20:
+            raise ValueError("overloaded")
+        yield data
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, max_tasks=8, min_tasks=2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph, logger=mock.MagicMock(), autoscale_interval=0.02)
+    executor.execute()
+
+    assert executor.data_flow_stats["node2"]["err"] == 40
+    assert max(concurrency_at_calls) > 2
+    # Back to the minimum number of tasks
+    assert concurrency_at_calls[-1] <= 2
+
+
+def test_rate_limit():
+    call_times = []
+
+    async def node1():
+        for i in range(10):
+            yield i
+
+    async def node2(data):
+        call_times.append(time.monotonic())
+        yield data
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, max_tasks=4, rate_limit=50, rate_limit_burst=2)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert executor.data_flow_stats["node2"]["out"] == 10
+    # Two calls right away, and then one call every 20 ms
+    assert call_times[1] - call_times[0] < 0.01
+    # No bursts afterwards, allowing for some delay of each call
+    assert all(t2 - t1 > 0.04 for t1, t2 in zip(call_times[1:], call_times[4:]))
+    assert call_times[-1] - call_times[0] >= 0.15
+
+
+def test_shared_rate_limiter():
+    call_times = []
+
+    async def node1():
+        for i in range(5):
+            yield i
+
+    async def node2(data):
+        call_times.append(time.monotonic())
+        yield
+
+    async def node3(data):
+        call_times.append(time.monotonic())
+        yield
+
+    graph = AsyncGraph()
+    graph.add_rate_limiter("api", 50)
+    graph.add_node(node1)
+    graph.add_node(node2, rate_limit="api")
+    graph.add_node(node3, rate_limit="api")
+    graph.add_edge("node1", "node2")
+    graph.add_edge("node1", "node3")
+
+    executor = AsyncExecutor(graph, fuse_chains=True)
+    executor.execute()
+
+    assert executor.data_flow_stats["node2"]["in"] == 5
+    assert executor.data_flow_stats["node3"]["in"] == 5
+    # 10 calls across both nodes at 50 calls per second
+    assert max(call_times) - min(call_times) >= 0.17
+
+
+def test_resource_pools():
+    concurrency = 0
+    max_concurrency = 0
+
+    async def node1():
+        for i in range(10):
+            yield i
+
+    async def query(data):
+        nonlocal concurrency, max_concurrency
+        concurrency += 1
+        max_concurrency = max(max_concurrency, concurrency)
+        await asyncio.sleep(0.01)
+        concurrency -= 1
+        yield data
+
+    async def node2(data):
+        async for item in query(data):
+            yield item
+
+    async def node3(data):
+        async for item in query(data):
+            yield item
+
+    graph = AsyncGraph()
+    graph.add_resource_pool("db", 3)
+    graph.add_node(node1)
+    graph.add_node(node2, max_tasks=4, resource_pools=["db"])
+    graph.add_node(node3, max_tasks=4, resource_pools=["db"])
+    graph.add_edge("node1", "node2")
+    graph.add_edge("node2", "node3")
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert executor.data_flow_stats["node3"]["out"] == 10
+    assert max_concurrency == 3
+
+
+def test_max_in_flight():
+    num_in_flight = 0
+    max_num_in_flight = 0
+
+    async def node1():
+        for i in range(20):
+            yield i
+
+    async def node2(data):
+        nonlocal num_in_flight, max_num_in_flight
+        num_in_flight += 1
+        max_num_in_flight = max(max_num_in_flight, num_in_flight)
+        await asyncio.sleep(0.001)
+        yield data
+
+    async def node3(data):
+        nonlocal num_in_flight
+        await asyncio.sleep(0.001)
+        num_in_flight -= 1
+        yield
+
+    graph = AsyncGraph(max_in_flight=4)
+    graph.add_node(node1)
+    graph.add_node(node2, max_tasks=10)
+    graph.add_node(node3)
+    graph.add_edge("node1", "node2")
+    graph.add_edge("node2", "node3")
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert executor.data_flow_stats["node3"]["in"] == 20
+    # The items from the start of node2's call to the end of node3's call
+    assert max_num_in_flight <= 4
+
+
+def test_max_in_flight_with_start_node_with_source_node():
+    async def node1():
+        for i in range(10):
+            yield i
+
+    async def node2(data):
+        yield data
+
+    async def node3(data):
+        await asyncio.sleep(0.001)
+        yield
+
+    graph = AsyncGraph(max_in_flight=3)
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_node(node3)
+    graph.add_edge("node1", "node2")
+    graph.add_edge("node2", "node3")
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        await asyncio.wait_for(executor.run({"node1": (), "node2": (0,)}), 5)
+
+    asyncio.run(main())
+
+    assert executor.data_flow_stats["node2"]["in"] == 10
+    assert executor.data_flow_stats["node3"]["in"] == 11
+
+
+def test_max_in_flight_with_fused_chain():
+    num_queued = 0
+    max_num_queued = 0
+
+    async def node1():
+        for i in range(200):
+            yield i
+
+    async def node2(data):
+        nonlocal num_queued, max_num_queued
+        num_queued += 1
+        max_num_queued = max(max_num_queued, num_queued)
+        yield data
+
+    async def node3(data):
+        nonlocal num_queued
+        num_queued -= 1
+        await asyncio.sleep(0.001)
+        yield
+
+    graph = AsyncGraph(max_in_flight=5)
+    graph.add_node(node1)
+    graph.add_node(node2)
+    graph.add_node(node3, max_tasks=2)
+    graph.add_edge("node1", "node2")
+    graph.add_edge("node2", "node3")
+
+    executor = AsyncExecutor(graph, fuse_chains=True)
+    with mock.patch("asyncio.create_task", wraps=asyncio.create_task) as create_task:
+        executor.execute()
+
+    # node2 is called by node1's task.
+    task_names = {call.kwargs.get("name") for call in create_task.call_args_list}
+    assert "node2_0" not in task_names
+    assert executor.data_flow_stats["node3"]["in"] == 200
+    assert max_num_queued <= 5
+
+
+def test_max_in_flight_with_batched_node():
+    batches = []
+
+    async def node1():
+        for i in range(30):
+            yield i
+
+    async def node2(batch):
+        batches.append(batch)
+        yield
+
+    graph = AsyncGraph(max_in_flight=5)
+    graph.add_node(node1)
+    graph.add_node(node2, batch_size=10)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        await asyncio.wait_for(executor.run(), 5)
+
+    # The items in a partial batch don't keep node1 waiting for room.
+    asyncio.run(main())
+
+    assert batches == [list(range(i, i + 10)) for i in range(0, 30, 10)]
+
+
+def test_max_in_flight_with_custom_queue_subclass():
+    batches = []
+
+    class BatchQueue(asyncio.Queue):
+        def __init__(self, batch_size):
+            super().__init__()
+            self.batch_size = batch_size
+            self.batch = []
+
+        async def put(self, item):
+            self.batch.append(item)
+            if len(self.batch) >= self.batch_size:
+                await super().put(self.batch)
+                self.batch = []
+
+    async def node1():
+        for i in range(20):
+            yield i
+
+    async def node2(batch):
+        batches.append(batch)
+        yield
+
+    graph = AsyncGraph(max_in_flight=5)
+    graph.add_node(node1)
+    graph.add_node(node2, queue=BatchQueue(batch_size=10))
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+
+    async def main():
+        await asyncio.wait_for(executor.run(), 5)
+
+    # The items put into the queue subclass aren't counted in flight,
+    # since it gets fewer items than it's put.
+    asyncio.run(main())
+
+    assert batches == [list(range(10)), list(range(10, 20))]
+
+
+@pytest.mark.parametrize(
+    "setup_scope, expected_num_setups",
+    [("task", 3), ("node", 1)],
+)
+def test_setup_and_teardown(setup_scope, expected_num_setups):
+    contexts = []
+    torn_down = []
+    results = []
+
+    async def setup():
+        context = {"id": len(contexts)}
+        contexts.append(context)
+        await asyncio.sleep(0)
+        return context
+
+    async def teardown(context):
+        torn_down.append(context["id"])
+
+    async def node1():
+        for i in range(9):
+            yield i
+
+    async def node2(context, data):
+        await asyncio.sleep(0.001)
+        results.append((context["id"], data))
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(
+        node2, max_tasks=3, setup=setup, teardown=teardown, setup_scope=setup_scope
+    )
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph)
+    executor.execute()
+
+    assert sorted(data for _, data in results) == list(range(9))
+    assert len(contexts) == expected_num_setups
+    assert sorted(torn_down) == list(range(expected_num_setups))
+    assert {context_id for context_id, _ in results} == set(torn_down)
+
+
+def test_setup_with_exception():
+    num_setup_calls = 0
+
+    async def setup():
+        nonlocal num_setup_calls
+        num_setup_calls += 1
+        if num_setup_calls == 1:
+            raise ConnectionError("can't connect")
+        return "connection"
+
+    async def node1():
+        for i in range(3):
+            yield i
+
+    async def node2(connection, data):
+        yield connection, data
+
+    logger = mock.MagicMock()
+    graph = AsyncGraph()
+    graph.add_node(node1)
+    graph.add_node(node2, setup=setup)
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph, logger=logger)
+    executor.execute()
+
+    assert num_setup_calls == 2
+    assert executor.data_flow_stats["node2"] == {
+        "in": 3,
+        "out": 2,
+        "err": 1,
+        "drop": 0,
+    }
+    assert isinstance(executor.exceptions["node2"][0], ConnectionError)
+
+
+@pytest.mark.parametrize(
+    "scheduling, priorities, expected_max_in_flight",
+    [
+        (None, {}, 100),
+        ("downstream_first", {}, 1),
+        ("priority", {"node2": 1}, 1),
+        ("priority", {"node1": 1}, 100),
+    ],
+)
+def test_scheduling(scheduling, priorities, expected_max_in_flight):
+    num_produced = 0
+    num_consumed = 0
+    max_in_flight = 0
+
+    async def node1():
+        nonlocal num_produced
+        for i in range(100):
+            num_produced += 1
+            yield i
+
+    async def node2(data):
+        nonlocal num_consumed, max_in_flight
+        max_in_flight = max(max_in_flight, num_produced - num_consumed)
+        num_consumed += 1
+        yield
+
+    graph = AsyncGraph()
+    graph.add_node(node1, priority=priorities.get("node1", 0))
+    graph.add_node(node2, priority=priorities.get("node2", 0))
+    graph.add_edge("node1", "node2")
+
+    executor = AsyncExecutor(graph, scheduling=scheduling)
+    executor.execute()
+
+    assert num_consumed == 100
+    assert max_in_flight == expected_max_in_flight
+
+
+def test_invalid_scheduling():
+    with pytest.raises(ValueError) as excinfo:
+        AsyncExecutor(AsyncGraph(), scheduling="fifo")
+    assert str(excinfo.value) == (
+        "scheduling must be one of ('priority', 'downstream_first'): 'fifo'"
+    )
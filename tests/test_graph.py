@@ -1,3 +1,4 @@
+import asyncio
 import inspect
 from unittest import mock
 
@@ -87,6 +88,20 @@ class TestAsyncGraphAddNode:
                 "queue": None,
                 "queue_size": 10_000,
                 "unpack_input": True,
+                "executor": "async",
+                "max_workers": None,
+                "batch_size": None,
+                "batch_bytes": None,
+                "batch_timeout": None,
+                "flush": None,
+                "min_tasks": None,
+                "rate_limit": None,
+                "rate_limit_burst": None,
+                "resource_pools": None,
+                "setup": None,
+                "teardown": None,
+                "setup_scope": "task",
+                "priority": 0,
             },
             {
                 "func": mock.ANY,
@@ -96,6 +111,20 @@ class TestAsyncGraphAddNode:
                 "queue": None,
                 "queue_size": 10_000,
                 "unpack_input": True,
+                "executor": "async",
+                "max_workers": None,
+                "batch_size": None,
+                "batch_bytes": None,
+                "batch_timeout": None,
+                "flush": None,
+                "min_tasks": None,
+                "rate_limit": None,
+                "rate_limit_burst": None,
+                "resource_pools": None,
+                "setup": None,
+                "teardown": None,
+                "setup_scope": "task",
+                "priority": 0,
             },
             {
                 "func": mock.ANY,
@@ -105,6 +134,20 @@ class TestAsyncGraphAddNode:
                 "queue": None,
                 "queue_size": 10_000,
                 "unpack_input": True,
+                "executor": "async",
+                "max_workers": None,
+                "batch_size": None,
+                "batch_bytes": None,
+                "batch_timeout": None,
+                "flush": None,
+                "min_tasks": None,
+                "rate_limit": None,
+                "rate_limit_burst": None,
+                "resource_pools": None,
+                "setup": None,
+                "teardown": None,
+                "setup_scope": "task",
+                "priority": 0,
             },
         ]
 
@@ -147,3 +190,224 @@ class TestAsyncGraphAddEdge:
             etl_graph.add_edge(src_node="load_node", dst_node="extract_node")
 
         assert "Graph has a cycle" in str(excinfo.value)
+
+    def test_add_edge_with_invalid_on_full(self):
+        etl_graph = async_graph_with_nodes_mock()
+
+        with pytest.raises(ValueError) as excinfo:
+            etl_graph.add_edge("extract_node", "transform_node", on_full="drop")
+        assert "on_full must be one of" in str(excinfo.value)
+        assert etl_graph.edges == set()
+
+    def test_add_edge_self_loop(self):
+        etl_graph = async_graph_with_nodes_mock()
+
+        with pytest.raises(InvalidAsyncGraphError) as excinfo:
+            etl_graph.add_edge(src_node="extract_node", dst_node="extract_node")
+        assert "Graph has a cycle" in str(excinfo.value)
+
+    def test_add_edge_cycle_not_added(self):
+        etl_graph = async_graph_with_nodes_mock()
+        etl_graph.add_edge(src_node="extract_node", dst_node="transform_node")
+        etl_graph.add_edge(src_node="transform_node", dst_node="load_node")
+
+        with pytest.raises(InvalidAsyncGraphError):
+            etl_graph.add_edge(src_node="load_node", dst_node="extract_node")
+
+        assert etl_graph.edges == {
+            ("extract_node", "transform_node"),
+            ("transform_node", "load_node"),
+        }
+        assert etl_graph._get_start_nodes() == {"extract_node"}
+
+
+def test_get_start_nodes():
+    etl_graph = async_graph_with_nodes_mock()
+    assert etl_graph._get_start_nodes() == {
+        "extract_node",
+        "transform_node",
+        "load_node",
+    }
+
+    etl_graph.add_edge(src_node="extract_node", dst_node="load_node")
+    assert etl_graph._get_start_nodes() == {"extract_node", "transform_node"}
+
+    etl_graph.add_edge(src_node="transform_node", dst_node="load_node")
+    assert etl_graph._get_start_nodes() == {"extract_node", "transform_node"}
+
+    etl_graph.add_edge(src_node="extract_node", dst_node="transform_node")
+    assert etl_graph._get_start_nodes() == {"extract_node"}
+
+
+class TestAsyncGraphNodeExecutor:
+    def test_invalid_executor(self):
+        async def some_func():
+            yield
+
+        with pytest.raises(ValueError) as excinfo:
+            AsyncGraph().add_node(some_func, executor="gpu")
+        assert "executor must be one of" in str(excinfo.value)
+
+    def test_process_executor_requires_generator_function(self):
+        async def async_gen_func():
+            yield
+
+        def gen_func():
+            yield
+
+        with pytest.raises(TypeError) as excinfo:
+            AsyncGraph().add_node(async_gen_func, executor="process")
+        assert str(excinfo.value) == (
+            "node 'async_gen_func' isn't a generator function"
+        )
+
+        graph = AsyncGraph()
+        graph.add_node(gen_func, executor="process", max_workers=2)
+        assert graph._nodes["gen_func"].executor == "process"
+        assert graph._nodes["gen_func"].max_workers == 2
+
+    def test_batching_args(self):
+        async def some_func(data):
+            yield
+
+        with pytest.raises(ValueError) as excinfo:
+            AsyncGraph().add_node(some_func, batch_size=0)
+        assert str(excinfo.value) == "batch_size must be positive: 0"
+
+        with pytest.raises(ValueError) as excinfo:
+            AsyncGraph().add_node(some_func, batch_size=2, queue=asyncio.Queue())
+        assert str(excinfo.value) == "batching can't be used with a custom queue"
+
+        graph = AsyncGraph()
+        graph.add_node(some_func)
+        assert not graph._nodes["some_func"].is_batched
+        graph = AsyncGraph()
+        graph.add_node(some_func, batch_timeout=0.5)
+        assert graph._nodes["some_func"].is_batched
+
+    def test_flush_arg(self):
+        async def some_func(data):
+            yield
+
+        def not_async_gen_func():
+            yield
+
+        with pytest.raises(TypeError) as excinfo:
+            AsyncGraph().add_node(some_func, flush=not_async_gen_func)
+        assert str(excinfo.value) == (
+            "flush of node 'some_func' isn't an async generator function"
+        )
+
+    @pytest.mark.parametrize("min_tasks", [0, 5])
+    def test_invalid_min_tasks(self, min_tasks):
+        async def some_func(data):
+            yield
+
+        with pytest.raises(ValueError) as excinfo:
+            AsyncGraph().add_node(some_func, max_tasks=4, min_tasks=min_tasks)
+        assert str(excinfo.value) == (
+            f"min_tasks must be between 1 and max_tasks (4): {min_tasks}"
+        )
+
+    def test_add_rate_limiter(self):
+        async def some_func(data):
+            yield
+
+        graph = AsyncGraph()
+        graph.add_rate_limiter("api", 10, burst=5)
+        graph.add_node(some_func, rate_limit="api")
+        assert graph.nodes[0]["rate_limit"] == "api"
+        assert graph.nodes[0]["rate_limit_burst"] is None
+
+        with pytest.raises(ValueError) as excinfo:
+            graph.add_rate_limiter("api", 20)
+        assert str(excinfo.value) == "rate limiter 'api' already exists in the graph"
+
+    @pytest.mark.parametrize(
+        "kwargs, expected_error",
+        [
+            ({"rate_limit": 0}, "rate limit must be positive: 0"),
+            ({"rate_limit": 10, "rate_limit_burst": 0}, "burst must be at least 1: 0"),
+            ({"rate_limit_burst": 5}, "rate_limit_burst requires rate_limit"),
+            ({"rate_limit": "api"}, "rate limiter 'api' not registered in the graph"),
+        ],
+    )
+    def test_invalid_rate_limit(self, kwargs, expected_error):
+        async def some_func(data):
+            yield
+
+        with pytest.raises(ValueError) as excinfo:
+            AsyncGraph().add_node(some_func, **kwargs)
+        assert str(excinfo.value) == expected_error
+
+    def test_add_resource_pool(self):
+        async def some_func(data):
+            yield
+
+        graph = AsyncGraph()
+        graph.add_resource_pool("db", 2)
+        graph.add_resource_pool("api", 5)
+        graph.add_node(some_func, resource_pools=["db", "api", "db"])
+        assert graph.nodes[0]["resource_pools"] == ("api", "db")
+
+        with pytest.raises(ValueError) as excinfo:
+            graph.add_resource_pool("db", 3)
+        assert str(excinfo.value) == "resource pool 'db' already exists in the graph"
+
+        with pytest.raises(ValueError) as excinfo:
+            graph.add_resource_pool("cache", 0)
+        assert str(excinfo.value) == (
+            "size of resource pool 'cache' must be at least 1: 0"
+        )
+
+        with pytest.raises(ValueError) as excinfo:
+            graph.add_node(some_func, name="other", resource_pools=["cache"])
+        assert str(excinfo.value) == "resource pool 'cache' not registered in the graph"
+
+    def test_invalid_max_in_flight(self):
+        with pytest.raises(ValueError) as excinfo:
+            AsyncGraph(max_in_flight=0)
+        assert str(excinfo.value) == "max_in_flight must be at least 1: 0"
+
+    def test_setup_args(self):
+        async def some_func(context, data):
+            yield
+
+        async def setup():
+            return "context"
+
+        async def teardown(context):
+            pass
+
+        with pytest.raises(ValueError) as excinfo:
+            AsyncGraph().add_node(some_func, setup=setup, setup_scope="graph")
+        assert str(excinfo.value) == (
+            "setup_scope must be one of ('task', 'node'): 'graph'"
+        )
+
+        def gen_func(context, data):
+            yield
+
+        with pytest.raises(ValueError) as excinfo:
+            AsyncGraph().add_node(gen_func, setup=setup, executor="process")
+        assert str(excinfo.value) == "setup can't be used with the process executor"
+
+        with pytest.raises(TypeError) as excinfo:
+            AsyncGraph().add_node(some_func, setup=lambda: "context")
+        assert str(excinfo.value) == (
+            "setup of node 'some_func' isn't a coroutine function"
+        )
+
+        with pytest.raises(ValueError) as excinfo:
+            AsyncGraph().add_node(some_func, teardown=teardown)
+        assert str(excinfo.value) == "teardown requires setup"
+
+    def test_get_node_depths(self):
+        graph = AsyncGraph()
+        for name in ("a", "b", "c", "d", "e"):
+            graph.add_node(mock.Mock(__name__=name), check_async_gen=False)
+        graph.add_edge("a", "b")
+        graph.add_edge("b", "c")
+        graph.add_edge("a", "c")
+        graph.add_edge("c", "d")
+        assert graph._get_node_depths() == {"a": 0, "b": 1, "c": 2, "d": 3, "e": 0}
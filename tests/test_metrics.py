@@ -0,0 +1,27 @@
+import math
+
+from async_graph_data_flow.metrics import DEFAULT_BUCKETS, Histogram
+
+
+def test_histogram():
+    histogram = Histogram((0.1, 1.0, 10.0))
+    assert histogram.quantile(0.5) is None
+    assert histogram.snapshot()["mean"] is None
+
+    for value in (0.05, 0.5, 0.5, 5.0, 50.0):
+        histogram.record(value)
+
+    snapshot = histogram.snapshot()
+    assert snapshot["count"] == 5
+    assert math.isclose(snapshot["sum"], 56.05)
+    assert math.isclose(snapshot["mean"], 11.21)
+    assert snapshot["p50"] == 1.0
+    assert snapshot["p90"] == math.inf
+    assert snapshot["buckets"] == [(0.1, 1), (1.0, 2), (10.0, 1), (math.inf, 1)]
+
+
+def test_default_buckets():
+    assert DEFAULT_BUCKETS[:3] == (1e-06, 2e-06, 5e-06)
+    assert DEFAULT_BUCKETS[-1] == 100.0
+    assert all(type(bound) is float for bound in DEFAULT_BUCKETS)
+    assert list(DEFAULT_BUCKETS) == sorted(DEFAULT_BUCKETS)